@@ -0,0 +1,125 @@
+import argparse
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+import time
+
+import loader
+from headless import HeadlessChip8
+
+# A headless emulation job. Exactly one of cycles or frames is the budget,
+# inputs maps a frame number to the 16-bit key mask held from that frame
+# on, and seed seeds CXNN
+Job = collections.namedtuple(
+    'Job',
+    ['rom', 'cycles', 'frames', 'inputs', 'seed', 'engine'],
+    defaults=(None, None, None, 0, 'interpreter')
+)
+
+
+def run_job(job):
+    '''
+    Runs one job to completion and returns its result. Runs in a worker
+    process, so everything it takes and returns must pickle
+    '''
+
+    machine = HeadlessChip8(
+        loader.load_rom(job.rom),
+        engine=job.engine,
+        seed=job.seed
+    )
+
+    if job.inputs:
+        machine.play_inputs(job.inputs)
+
+    report = machine.run(cycles=job.cycles, frames=job.frames)
+    report['job'] = job
+    report['screen'] = hashlib.sha1(
+        repr(machine.display.rows).encode()
+    ).hexdigest()
+    return report
+
+
+def run_batch(jobs, workers=None):
+    '''
+    Runs jobs across a pool of worker processes (one per core by default)
+    and yields each result as soon as it finishes, in completion order
+    '''
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(run_job, job) for job in jobs]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+class Throughput:
+    '''
+    Aggregates results from run_batch - the instructions per second of the
+    whole batch is measured against wall time, so it reflects how well the
+    pool scales rather than the speed of one job
+    '''
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.jobs = 0
+        self.cycles = 0
+        self.cpu_seconds = 0
+
+    def add(self, result):
+        self.jobs += 1
+        self.cycles += result['cycles']
+        self.cpu_seconds += result['seconds']
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'jobs': self.jobs,
+            'cycles': self.cycles,
+            'seconds': elapsed,
+            'instructions_per_second': self.cycles / elapsed if elapsed else 0,
+            'parallelism': self.cpu_seconds / elapsed if elapsed else 0,
+        }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run ROMs headless across a process pool"
+    )
+    parser.add_argument("roms", nargs="+", help="ROM file paths")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--seeds", type=int, default=1, help="Runs per ROM")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--engine",
+        choices=("interpreter", "translator", "aot"),
+        default="interpreter"
+    )
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    jobs = [
+        Job(rom, frames=args.frames, seed=seed, engine=args.engine)
+        for rom in args.roms
+        for seed in range(args.seeds)
+    ]
+
+    throughput = Throughput()
+    for result in run_batch(jobs, workers=args.workers):
+        throughput.add(result)
+        state = result['state']
+        print(json.dumps({
+            'rom': result['job'].rom,
+            'seed': result['job'].seed,
+            'instructions_per_second': round(
+                result['instructions_per_second']
+            ),
+            'pc': state['pc'],
+            'registers': list(state['registers'].values()),
+            'screen': result['screen'],
+        }))
+
+    print(json.dumps(throughput.summary()))
@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from compiler import CompiledEngine
+from display import Display
+from headless import ENGINES, HeadlessChip8
+
+# Synthetic ROMs, each an endless loop stressing one family of handlers
+ROMS = {
+    # 8XYN register ops
+    'alu': [
+        0x6001,  # V0 = 01
+        0x6103,  # V1 = 03
+        0x8014,  # V0 += V1
+        0x8015,  # V0 -= V1
+        0x8011,  # V0 |= V1
+        0x8012,  # V0 &= V1
+        0x8013,  # V0 ^= V1
+        0x8016,  # V0 >>= 1
+        0x801E,  # V0 <<= 1
+        0x8017,  # V0 = V1 - V0
+        0x8010,  # V0 = V1
+        0x1204,  # Loop back to 8014
+    ],
+    # DXYN sprite draws, moving across the screen so rows wrap
+    'draw': [
+        0xA000,  # I = font 0
+        0xD01F,  # Draw 15 rows at (V0, V1)
+        0x7003,  # V0 += 3
+        0x7101,  # V1 += 1
+        0x1202,  # Loop back to D01F
+    ],
+    # FX55 / FX65 / FX33 memory ops
+    'memory': [
+        0xA400,  # I = 400
+        0x6A55,  # VA = 55
+        0xFF55,  # Store V0 - VF at I
+        0xFF65,  # Fill V0 - VF from I
+        0xFA33,  # BCD of VA at I
+        0x1202,  # Loop back to FF55
+    ],
+    # 2NNN / 00EE chains three deep
+    'calls': [
+        0x2206,  # Call 206
+        0x1200,  # Loop
+        0x0000,
+        0x220A,  # 206: call 20A
+        0x00EE,
+        0x220E,  # 20A: call 20E
+        0x00EE,
+        0x00EE,  # 20E: return
+    ],
+    # Key and delay timer polling
+    'input': [
+        0x6030,  # V0 = 30
+        0x6205,  # V2 = key 5
+        0xF015,  # 204: delay timer = V0
+        0xF107,  # 206: V1 = delay timer
+        0x4100,  # Skip if V1 != 0
+        0x1204,  # Timer ran out - set it again
+        0xE29E,  # Skip if key V2 pressed
+        0xE2A1,  # Skip if key V2 not pressed
+        0x1200,  # Key pressed - start over
+        0x1206,  # Loop back to F107
+    ],
+}
+
+INSTRUCTIONS = 200000
+RENDER_FRAMES = 200
+REGRESSION_THRESHOLD = 0.2
+
+
+def assemble(ops):
+    return b''.join(op.to_bytes(2, 'big') for op in ops)
+
+
+def measure_rom(name, engine, instructions):
+    rom = assemble(ROMS[name])
+
+    machine = HeadlessChip8(rom, instructions_per_frame=1000, engine=engine)
+    report = machine.run(cycles=instructions)
+
+    # Peak memory is measured on a separate, shorter run since tracing
+    # allocations slows everything down
+    tracemalloc.start()
+    HeadlessChip8(rom, engine=engine).run(cycles=instructions // 20)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'instructions_per_second': report['instructions_per_second'],
+        'peak_memory': peak,
+    }
+
+
+def measure_renderers(frames):
+    '''
+    Frame time of each renderer drawing a busy screen, or nothing if
+    pygame isn't installed
+    '''
+
+    try:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        import pygame
+        from renderer import Renderer, SurfarrayRenderer, numpy
+    except ImportError:
+        return {}
+
+    pygame.display.init()
+    surface = pygame.display.set_mode((640, 320))
+
+    renderers = {'rects': Renderer}
+    if numpy is not None:
+        renderers['surfarray'] = SurfarrayRenderer
+
+    results = {}
+    for name, renderer_class in renderers.items():
+        display = Display()
+        renderer = renderer_class(display, surface, 10)
+        sprite = [0xFF, 0x81, 0xBD, 0xA5, 0xA5, 0xBD, 0x81, 0xFF] * 2
+
+        elapsed = 0
+        for frame in range(frames):
+            for i in range(16):
+                display.draw_sprite(frame + i * 9, frame + i * 5, sprite)
+
+            started = time.perf_counter()
+            renderer.render()
+            elapsed += time.perf_counter() - started
+
+        results[name] = {'frame_ms': elapsed / frames * 1000}
+
+    pygame.display.quit()
+    return results
+
+
+def run(instructions=INSTRUCTIONS, render_frames=RENDER_FRAMES):
+    results = {}
+
+    # Compiled modules go in a scratch cache rather than the user's
+    with tempfile.TemporaryDirectory() as cache_dir:
+        engines = dict(ENGINES)
+        engines['aot'] = lambda cpu: CompiledEngine(cpu, cache_dir)
+
+        for name in ROMS:
+            for engine, factory in engines.items():
+                results['%s/%s' % (name, engine)] = measure_rom(
+                    name,
+                    factory,
+                    instructions
+                )
+
+    for name, result in measure_renderers(render_frames).items():
+        results['render/%s' % name] = result
+
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    '''
+    Returns a message for every result that regressed past threshold
+    (a fraction) against the baseline. Instructions per second should not
+    drop, frame time and peak memory should not rise
+    '''
+
+    regressions = []
+    for name, result in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+
+        for metric, value in result.items():
+            before = previous.get(metric)
+            if not before:
+                continue
+
+            if metric == 'instructions_per_second':
+                change = (before - value) / before
+            else:
+                change = (value - before) / before
+
+            if change > threshold:
+                regressions.append(
+                    "%s %s regressed %.0f%% (%.4g -> %.4g)" % (
+                        name,
+                        metric,
+                        change * 100,
+                        before,
+                        value
+                    )
+                )
+
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Chip-8 engines and renderers"
+    )
+    parser.add_argument("--instructions", type=int, default=INSTRUCTIONS)
+    parser.add_argument("--render-frames", type=int, default=RENDER_FRAMES)
+    parser.add_argument("--save", metavar="PATH", help="Write results here")
+    parser.add_argument(
+        "--baseline",
+        metavar="PATH",
+        help="Fail if results regress against this saved run"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=REGRESSION_THRESHOLD,
+        help="Allowed regression as a fraction, 0.2 by default"
+    )
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = run(args.instructions, args.render_frames)
+
+    for name, result in sorted(results.items()):
+        print("%-24s %s" % (name, "  ".join(
+            "%s=%.4g" % item for item in sorted(result.items())
+        )))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+        for regression in regressions:
+            print(regression)
+
+        if regressions:
+            sys.exit(1)
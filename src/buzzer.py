@@ -0,0 +1,123 @@
+import array
+
+
+class Buzzer:
+    '''
+    Sounds the Chip-8 buzzer while the sound timer is non-zero. Runs as a
+    Scheduler tick listener, so it sees the timer before it ticks and an
+    ST of N sounds for N frames. Only tells the backend when the timer
+    starts or stops, so the instructions themselves never touch audio and
+    starting or stopping lags the timer by at most one frame
+    '''
+
+    def __init__(self, mmu, backend):
+        self.mmu = mmu
+        self.backend = backend
+        self.playing = False
+
+    def update(self):
+        sounding = self.mmu.sound_timer > 0
+        if sounding != self.playing:
+            self.playing = sounding
+            if sounding:
+                self.backend.start()
+            else:
+                self.backend.stop()
+
+    def stop(self):
+        if self.playing:
+            self.playing = False
+            self.backend.stop()
+
+
+class NullBackend:
+    '''
+    Backend for headless runs and hosts without audio. Only counts how
+    many times the buzzer was started
+    '''
+
+    def __init__(self):
+        self.starts = 0
+
+    def start(self):
+        self.starts += 1
+
+    def stop(self):
+        pass
+
+
+class PygameBackend:
+    '''
+    Plays a square wave through the pygame mixer. The tone is generated
+    once, as a whole number of periods so it loops without a click, and
+    starting the buzzer just loops it on a channel
+    '''
+
+    FREQUENCY = 440
+    VOLUME = 0.25
+
+    # Mixer settings - a 512 sample buffer is about 12 ms at 44.1 kHz, so
+    # audio starts and stops within a 60 Hz frame of the timer
+    SAMPLE_RATE = 44100
+    BUFFER_SIZE = 512
+
+    def __init__(self, frequency=FREQUENCY, volume=VOLUME):
+        import pygame.mixer
+
+        self.mixer = pygame.mixer
+        self.sound = self.mixer.Sound(buffer=self._tone(frequency, volume))
+
+    @classmethod
+    def pre_init(cls):
+        '''
+        Call before pygame.init() so the mixer starts with a low latency
+        buffer
+        '''
+
+        import pygame.mixer
+
+        pygame.mixer.pre_init(cls.SAMPLE_RATE, -16, 1, cls.BUFFER_SIZE)
+
+    def start(self):
+        self.sound.play(loops=-1)
+
+    def stop(self):
+        self.sound.stop()
+
+    def _tone(self, frequency, volume):
+        rate, _, channels = self.mixer.get_init()
+        period = max(2, round(rate / frequency))
+        amplitude = int(0x7FFF * volume)
+
+        # A tenth of a second or so of whole periods, every sample repeated
+        # for each channel
+        wave = array.array('h')
+        for i in range(period * max(1, rate // 10 // period)):
+            sample = amplitude if i % period < period // 2 else -amplitude
+            wave.extend([sample] * channels)
+
+        return wave.tobytes()
+
+
+def create_backend(kind='auto'):
+    '''
+    Builds an audio backend - 'pygame' for the mixer, 'null' for silence,
+    or 'auto' for the mixer when pygame has one working. Falls back to the
+    NullBackend without one. pygame is only imported here, so headless
+    runs never load it
+    '''
+
+    if kind not in ('auto', 'pygame'):
+        return NullBackend()
+
+    try:
+        import pygame.mixer
+    except ImportError:
+        return NullBackend()
+
+    try:
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+        return PygameBackend()
+    except pygame.error:
+        return NullBackend()
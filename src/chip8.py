@@ -1,56 +1,237 @@
+import asyncio
+import random
 import sys
+import time
 import pygame
 import pygame.locals
 
+from buzzer import Buzzer, PygameBackend, create_backend
 from cpu import Cpu
+from debug import DebugPanel
 from display import Display
 from keyboard import Keyboard
 from mmu import Mmu
+from movie import MovieRecorder
+from renderer import create_renderer
+from rewind import RewindBuffer
+from scheduler import Scheduler
 
 
 class Chip8:
 
     DISPLAY_SCALE = 10
-    TIMER = pygame.USEREVENT + 1
+    REWIND_KEY = pygame.K_BACKSPACE
+    REWIND_STEP = 60  # Frames rewound per press of REWIND_KEY
+
+    def __init__(
+        self,
+        rom,
+        instructions_per_frame=Scheduler.INSTRUCTIONS_PER_FRAME,
+        scale=DISPLAY_SCALE,
+        palette=None,
+        renderer='auto',
+        debug=True,
+        debug_refresh_rate=DebugPanel.REFRESH_RATE,
+        rewind=True,
+        seed=None,
+        record=None,
+        sound=True
+    ):
+        PygameBackend.pre_init()
+        pygame.init()
 
-    def __init__(self, rom):
-        self.debug = []
+        self.debug = debug
+        self.running = False
+        self.scale = scale
         self.display = Display()
         self.keyboard = Keyboard()
         self.mmu = Mmu()
 
-        self.mmu.load_rom(rom)
-        self.cpu = Cpu(self.mmu, self.display, self.keyboard)
+        # When recording a movie to the path in record, the Cpu reads keys
+        # latched once a frame by the recorder. Rewinding would make the
+        # session impossible to replay, so it is off while recording
+        self.record = record
+        self.recorder = None
+        keyboard = self.keyboard
+        if record is not None:
+            if seed is None:
+                seed = random.getrandbits(32)
+            self.recorder = MovieRecorder(
+                self.keyboard,
+                rom,
+                seed,
+                instructions_per_frame
+            )
+            keyboard = self.recorder.keyboard
+            rewind = False
 
-        pygame.init()
+        self.mmu.load_rom(rom)
+        self.cpu = Cpu(self.mmu, self.display, keyboard, seed=seed)
+        self.scheduler = Scheduler(
+            self.cpu,
+            self.mmu,
+            instructions_per_frame=instructions_per_frame
+        )
+
+        if self.recorder is not None:
+            self.scheduler.frame_listeners.append(self.recorder.end_frame)
+
+        self.buzzer = Buzzer(
+            self.mmu,
+            create_backend('auto' if sound else 'null')
+        )
+        self.scheduler.tick_listeners.append(self.buzzer.update)
+
+        self.rewind_buffer = None
+        if rewind:
+            self.rewind_buffer = RewindBuffer()
+            self.scheduler.frame_listeners.append(
+                lambda: self.rewind_buffer.push(self.cpu)
+            )
 
         self.font = pygame.font.SysFont("monospace", 20)
         self.window = self._init_canvas()
-
-        self.debug = True
+        self.renderer = create_renderer(
+            self.display,
+            self.canvas,
+            self.scale,
+            palette=palette,
+            kind=renderer
+        )
+
+        self.debug_panel = None
+        if self.debug:
+            self.debug_panel = DebugPanel(
+                self.cpu,
+                self.scheduler,
+                self.canvas,
+                self.font,
+                self.display.height * self.scale,
+                refresh_rate=debug_refresh_rate
+            )
 
     def run(self):
-        # Main emu loop
-        pygame.time.set_timer(self.TIMER, 17)  # ~60 Hz
-
-        while True:
-            self.cpu.execute()
-
-            # Update screen
-            self._update_screen()
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    sys.exit()
-                elif event.type == self.TIMER:
-                    self.mmu.update_delay_timer()
-                    self.mmu.update_sound_timer()
+        # Main emu loop - the scheduler runs however many frames are due
+        # (instructions plus timer ticks) and we draw once after them
+        self.running = True
+        while self.running:
+            if self._idle():
+                # Blocked in FX0A with no timers running, so nothing can
+                # happen until an event arrives - sleep until one does
+                events = [pygame.event.wait()] + pygame.event.get()
+                self.scheduler.resync()
+            else:
+                events = pygame.event.get()
+
+            self._handle_events(events)
+            if not self.running:
+                break
+
+            if self.scheduler.tick():
+                self._update_screen()
+            else:
+                time.sleep(self.scheduler.time_until_next_frame())
+
+        self.quit()
+
+    async def run_async(self):
+        '''
+        Runs the emulator as a coroutine until the window is closed or
+        stop() is called, yielding to the event loop between frames. Closes
+        the session when it returns or is cancelled, but leaves pygame and
+        the process running
+        '''
+
+        self.running = True
+        self.scheduler.resync()
+        try:
+            while self.running:
+                if self._idle():
+                    # pygame's event queue can't be awaited, so poll it
+                    # once a frame without running any frames until
+                    # something happens
+                    events = await self._wait_for_events()
+                    self.scheduler.resync()
+                else:
+                    events = pygame.event.get()
+
+                self._handle_events(events)
+                if not self.running:
+                    break
+
+                if self.scheduler.tick():
+                    self._update_screen()
+
+                await asyncio.sleep(self.scheduler.time_until_next_frame())
+        finally:
+            self.close()
+
+    def stop(self):
+        '''
+        Ends run() or run_async() after the current pass of the loop
+        '''
+
+        self.running = False
+
+    def close(self):
+        '''
+        Silences the buzzer and saves the movie being recorded, if any
+        '''
+
+        self.running = False
+        self.buzzer.stop()
+
+        if self.recorder is not None:
+            self.recorder.finish(self.cpu).save(self.record)
+            self.recorder = None
+
+    def quit(self):
+        self.close()
+        sys.exit()
+
+    def rewind(self, frames):
+        '''
+        Steps the machine back the given number of frames, as far as the
+        rewind buffer goes. Returns how many frames were rewound
+        '''
+
+        if self.rewind_buffer is None:
+            return 0
+
+        rewound = self.rewind_buffer.rewind(self.cpu, frames)
+        self._update_screen()
+        return rewound
+
+    def _handle_events(self, events):
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.stop()
+            elif event.type == pygame.KEYDOWN and \
+                    event.key == self.REWIND_KEY:
+                self.rewind(self.REWIND_STEP)
+
+        self.keyboard.update()
+
+    async def _wait_for_events(self):
+        while self.running:
+            events = pygame.event.get()
+            if events:
+                return events
+
+            await asyncio.sleep(self.scheduler.frame_time)
+
+        return []
+
+    def _idle(self):
+        return self.cpu.halted and \
+            self.mmu.delay_timer == 0 and \
+            self.mmu.sound_timer == 0
 
     def _init_canvas(self):
-        width = self.display.width * self.DISPLAY_SCALE
-        height = self.display.height * self.DISPLAY_SCALE
+        width = self.display.width * self.scale
+        height = self.display.height * self.scale
         if self.debug:
-            height += 500
+            height += DebugPanel.height()
 
         size = width, height
         window = pygame.display.set_mode(size, pygame.locals.DOUBLEBUF)
@@ -63,31 +244,11 @@ class Chip8:
         return window
 
     def _update_screen(self):
-        self.canvas.fill((0, 0, 0))
-        rects = []
-
-        for pixel in self.display.get_set_pixels():
-            x = pixel[0]
-            y = pixel[1]
-
-            rect = pygame.draw.rect(self.canvas, (255, 255, 255), (
-                x * self.DISPLAY_SCALE,
-                y * self.DISPLAY_SCALE,
-                self.DISPLAY_SCALE,
-                self.DISPLAY_SCALE,
-            ))
+        rects = self.renderer.render()
 
-            rects.append(rect)
+        if self.debug_panel is not None:
+            rects.extend(self.debug_panel.render())
 
-        if self.debug:
-            registers = list(self.mmu.registers.keys())
-            lbls = []
-            for i in range(len(registers)):
-                reg = self.mmu.registers[registers[i]]
-                val = (registers[i], "{0:02x}".format(reg))
-                lbl = self.font.render("%s - %s" % val, 1, (255, 255, 255))
-                x, y = 10, (i * 20) + (self.display.height * self.DISPLAY_SCALE) + 10
-                self.canvas.blit(lbl, (x, y))
-                lbls.append(lbl)
-
-        pygame.display.flip()
+        # Nothing changed, so there's nothing to present
+        if rects:
+            pygame.display.update(rects)
@@ -0,0 +1,272 @@
+import argparse
+import glob
+import hashlib
+import importlib.util
+import os
+
+import loader
+from cpu import Cpu
+from disassembler import disassemble
+from display import Display
+from mmu import Mmu
+from translator import BlockTranslator
+
+CACHE_DIR = os.environ.get(
+    'CHIP8_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'chip8')
+)
+
+# Sources the generated code depends on - changing any of them changes
+# the emulator version, so stale modules are never loaded
+VERSIONED_MODULES = ('compiler.py', 'cpu.py', 'mmu.py', 'translator.py')
+
+MODULE_TEMPLATE = """'''
+Compiled ahead of time by compiler.py - generated, do not edit
+
+ROM {rom_hash}
+Emulator version {version}
+'''
+
+ROM_HASH = '{rom_hash}'
+VERSION = '{version}'
+
+{functions}
+
+# Start address -> (block function, end address)
+BLOCKS = {{
+{blocks}
+}}
+
+# Opcodes whose decoded handlers the blocks call as op_XXXX
+OPS = [{ops}]
+"""
+
+
+def emulator_version():
+    '''
+    Digest of the emulator sources compiled code depends on
+    '''
+
+    digest = hashlib.sha1()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in VERSIONED_MODULES:
+        with open(os.path.join(directory, name), 'rb') as f:
+            digest.update(f.read())
+
+    return digest.hexdigest()[:16]
+
+
+def successors(op, end):
+    '''
+    Where execution can go after the instruction op that ends a block at
+    end - None for a computed jump, which can't be followed statically
+    '''
+
+    prefix = op >> 12
+    if prefix == 0x1:
+        return [op & 0xFFF]
+    if prefix == 0x2:
+        # The subroutine, and the return address its 00EE comes back to
+        return [op & 0xFFF, end]
+    if op in (0x00EE, 0x00FD):
+        return []
+    if prefix == 0xB:
+        return None
+    if prefix in (0x3, 0x4, 0x5) or \
+            (prefix == 0xE and op & 0xFF in (0x9E, 0xA1)):
+        return [end, end + 2]
+    if prefix == 0x9:
+        # 9XY0 skips by a single byte - see Cpu
+        return [end, end + 1]
+
+    return [end]
+
+
+def compile_rom(rom):
+    '''
+    Recovers the control flow of a ROM from its entry point and returns
+    the source of a module holding a compiled block for every reachable
+    block start. Blocks are generated by the BlockTranslator, so compiled
+    code behaves exactly as translated code does
+    '''
+
+    mmu = Mmu()
+    mmu.load_rom(rom)
+    cpu = Cpu(mmu, Display(), None)
+    translator = BlockTranslator(cpu)
+
+    functions = []
+    blocks = []
+    ops = set()
+
+    pending = [loader.ROM_START]
+    seen = set()
+    while pending:
+        start = pending.pop()
+        if start in seen or start + 1 >= len(mmu.memory):
+            continue
+        seen.add(start)
+
+        generated = translator.generate(start)
+        if generated is None:
+            continue
+
+        function_name, source, end = generated
+
+        listing = []
+        for address in range(start, end, 2):
+            op = (mmu.memory[address] << 8) | mmu.memory[address + 1]
+            listing.append('# %03X  %04X  %s' % (
+                address,
+                op,
+                disassemble(op)
+            ))
+            ops.add(op)
+
+        functions.append('\n'.join(listing) + '\n' + source)
+        blocks.append('    0x%03X: (%s, 0x%03X),' % (
+            start,
+            function_name,
+            end
+        ))
+
+        last = (mmu.memory[end - 2] << 8) | mmu.memory[end - 1]
+        pending.extend(successors(last, end) or ())
+
+    # Only ops the blocks actually call need binding
+    bound = sorted(
+        op for op in ops
+        if 'op_%04X' % op in translator.namespace
+    )
+
+    return MODULE_TEMPLATE.format(
+        rom_hash=loader.rom_hash(rom),
+        version=emulator_version(),
+        functions='\n\n'.join(functions),
+        blocks='\n'.join(sorted(blocks)),
+        ops=', '.join('0x%04X' % op for op in bound)
+    )
+
+
+def compiled_path(rom, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, 'rom_%s_%s.py' % (
+        loader.rom_hash(rom)[:16],
+        emulator_version()
+    ))
+
+
+def evict_stale(path):
+    '''
+    Deletes the modules, and their cached bytecode, compiled for the same
+    ROM as path by other emulator versions
+    '''
+
+    directory, name = os.path.split(path)
+    stem = os.path.splitext(name)[0]
+    rom_prefix = stem.rsplit('_', 1)[0] + '_'
+
+    stale = glob.glob(os.path.join(directory, rom_prefix + '*.py')) + \
+        glob.glob(os.path.join(directory, '__pycache__', rom_prefix + '*.pyc'))
+    for stale_path in stale:
+        if os.path.basename(stale_path).split('.')[0] == stem:
+            continue
+
+        try:
+            os.remove(stale_path)
+        except FileNotFoundError:
+            # Another process evicted it first
+            pass
+
+
+def load_compiled(rom, cache_dir=CACHE_DIR):
+    '''
+    Returns a fresh instance of the compiled module for a ROM, compiling
+    and caching it first if this ROM and emulator version haven't been
+    compiled before, which evicts what older versions compiled for it.
+    Python caches the module's bytecode beside it, so later loads don't
+    parse or compile anything
+    '''
+
+    path = compiled_path(rom, cache_dir)
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Write then rename so a concurrent load never sees half a module
+        partial = '%s.%d.tmp' % (path, os.getpid())
+        with open(partial, 'w') as f:
+            f.write(compile_rom(rom))
+        os.replace(partial, path)
+
+        evict_stale(path)
+
+    # Each load is a new module object that isn't put in sys.modules, so
+    # machines running the same ROM don't share the module's globals
+    spec = importlib.util.spec_from_file_location(
+        os.path.splitext(os.path.basename(path))[0],
+        path
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    if module.ROM_HASH != loader.rom_hash(rom):
+        raise ValueError("Compiled module %s is for another ROM" % path)
+
+    return module
+
+
+def program_image(mmu):
+    '''
+    The ROM as loaded in memory, without the zeros that fill the rest of
+    it - compiling this gives the same code as compiling the ROM itself
+    '''
+
+    return bytes(mmu.memory[loader.ROM_START:]).rstrip(b'\x00') or b'\x00'
+
+
+class CompiledEngine(BlockTranslator):
+    '''
+    Execution engine running a ROM compiled ahead of time by compile_rom.
+    It has to be created before the Cpu runs, while memory still holds
+    the ROM as loaded. Anything the control flow recovery couldn't reach -
+    targets of BNNN computed jumps, or blocks dropped because the ROM
+    wrote over them - runs on the interpreter instead
+    '''
+
+    def __init__(self, cpu, cache_dir=CACHE_DIR):
+        super().__init__(cpu)
+
+        module = load_compiled(program_image(cpu.mmu), cache_dir)
+        module.cpu = cpu
+        module.mmu = cpu.mmu
+        for op in module.OPS:
+            setattr(module, 'op_%04X' % op, cpu.decoded[op])
+
+        for start, (function, end) in module.BLOCKS.items():
+            self.add_block(start, end, function)
+
+    def translate(self, start):
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compile a ROM ahead of time and print the module"
+    )
+    parser.add_argument("rom", help="ROM file path")
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Store the module in the cache instead of printing it"
+    )
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    rom = loader.load_rom(args.rom)
+
+    if args.cache:
+        load_compiled(rom)
+        print(compiled_path(rom))
+    else:
+        print(compile_rom(rom))
@@ -1,22 +1,60 @@
+import collections
+import functools
+import inspect
+import operator
 import random
 
-from util import int_to_hex
+
+# How to pull each named operand out of an op - handler signatures use these
+# names so the decoder knows what to pass them
+OPERANDS = {
+    'op': lambda op: op,
+    'x': lambda op: (op & 0xF00) >> 8,
+    'y': lambda op: (op & 0xF0) >> 4,
+    'n': lambda op: op & 0xF,
+    'nn': lambda op: op & 0xFF,
+    'nnn': lambda op: op & 0xFFF,
+}
+
+
+class DecodeCache(dict):
+    '''
+    Maps a 16-bit opcode to a ready to call handler with its operands bound.
+    Each opcode is decoded the first time it is looked up, so dispatching
+    after that is a single dict lookup and a single call
+    '''
+
+    def __init__(self, decode):
+        super().__init__()
+        self.decode = decode
+
+    def __missing__(self, op):
+        handler = self[op] = self.decode(op)
+        return handler
 
 
 class Cpu:
 
-    def __init__(self, mmu, display, keyboard):
+    def __init__(self, mmu, display, keyboard, seed=None):
         self.mmu = mmu
         self.display = display
         self.keyboard = keyboard
 
+        # Source for CXNN - seed it for reproducible runs
+        self.random = random.Random(seed)
+
         self.pc = 0x200  # THis is where game is loaded in memory
         self.stack = []
 
         self.halted = False
 
+        # Instructions left in the current run() - see fast_forward_idle()
+        self.budget = iter(())
+
+        # Cycles of the current run() spent waiting instead of executing
+        self.skipped_cycles = 0
+
         self.primary_op_handlers = {
-            0x0: lambda op: self.zero_prefix_op_handlers[op & 0xFFF](op),
             0x1: self.handle_jump_op,
             0x2: self.handle_call_op,
             0x3: self.handle_truthy_value_condition_op,
@@ -24,23 +62,30 @@ class Cpu:
             0x5: self.handle_truthy_register_condition_op,
             0x6: self.handle_set_register_to_value_op,
             0x7: self.handle_add_value_to_register_op,
-            0x8: lambda op: self.eight_prefix_op_handlers[op & 0xF](op),
             0x9: self.handle_falsey_register_condition_op,
             0xA: self.handle_address_register_to_value_op,
             0xB: self.handle_jump_with_offset_op,
             0xC: self.handle_set_register_to_random_bitwise_value_op,
             0xD: self.handle_draw_sprite_op,
-            0xE: lambda op: self.e_prefix_op_handlers[op & 0xFF](op),
-            0xF: lambda op: self.f_prefix_op_handlers[op & 0xFF](op)
         }
 
         # Ops that start with prefix 0 (i.e. 0x00EE) should lookup here by
         # their last three digits in the hex op
         self.zero_prefix_op_handlers = {
             0x0E0: self.handle_clear_screen_op,
-            0x0EE: self.handle_return_op
+            0x0EE: self.handle_return_op,
+            0x0FB: self.handle_scroll_right_op,
+            0x0FC: self.handle_scroll_left_op,
+            0x0FD: self.handle_exit_op,
+            0x0FE: self.handle_low_resolution_op,
+            0x0FF: self.handle_high_resolution_op,
         }
 
+        # 0x00CN - the scroll distance is part of the op
+        for n in range(0x10):
+            self.zero_prefix_op_handlers[0x0C0 | n] = \
+                self.handle_scroll_down_op
+
         # Ops that start with prefix 8 (i.e. 0x8XY0) should lookup here by
         # their last digit in the hex op
         self.eight_prefix_op_handlers = {
@@ -71,43 +116,194 @@ class Cpu:
             0x18: self.handle_set_sound_timer_to_register_op,
             0x1E: self.handle_add_register_to_address_op,
             0x29: self.handle_set_address_to_sprite_location_op,
+            0x30: self.handle_set_address_to_big_sprite_location_op,
             0x33: self.handle_set_bcd_op,
             0x55: self.handle_store_registers_in_address_op,
             0x65: self.handle_fill_registers_from_address_op,
+            0x75: self.handle_store_registers_in_flags_op,
+            0x85: self.handle_fill_registers_from_flags_op,
+        }
+
+        # Prefixes whose ops are looked up in a second table, along with the
+        # mask that selects the part of the op used as the key
+        self.prefix_op_handlers = {
+            0x0: (0xFFF, self.zero_prefix_op_handlers),
+            0x8: (0xF, self.eight_prefix_op_handlers),
+            0xE: (0xFF, self.e_prefix_op_handlers),
+            0xF: (0xFF, self.f_prefix_op_handlers),
         }
 
+        # Every opcode seen so far, mapped to its handler with the operands
+        # already extracted - see DecodeCache
+        self.decoded = DecodeCache(self.decode)
+
     def execute(self):
         if self.halted:
-            # Set it back to repeat and wait on instruction we are halted on
-            self.pc -= 2
-
-        print(self.pc)
+            # Waiting on FX0A - nothing runs until a key is down
+            if not self.poll_key():
+                self.skipped_cycles += 1
+            return
 
         # All opcodes are big endian
-        opcode = self._get_op()
+        memory = self.mmu.memory
+        pc = self.pc
+        self.pc = pc + 2
+
+        self.decoded[(memory[pc] << 8) | memory[pc + 1]]()
+
+    def run(self, cycles):
+        '''
+        Spends the given number of cycles executing instructions. Returns
+        how many were actually executed, which is fewer if the Cpu waited
+        in FX0A or skipped an idle loop
+        '''
+
+        if self.halted:
+            if not self.poll_key():
+                # Keys only change between frames, so if none is down the
+                # whole budget is spent waiting
+                return 0
+
+            cycles -= 1  # Finishing the wait takes a cycle
+            executed = 1
+        else:
+            executed = 0
+
+        self.skipped_cycles = 0
+        execute = self.execute
+        self.budget = iter(range(cycles))
+        for _ in self.budget:
+            execute()
+
+        self.budget = iter(())
+
+        return executed + cycles - self.skipped_cycles
+
+    def poll_key(self):
+        '''
+        Finishes a pending FX0A if a key is down, storing it in the VX of
+        the FX0A just executed. Returns whether the Cpu is running again
+        '''
+
+        key = self.keyboard.get_pressed()
+        if key is None:
+            return False
+
+        self.mmu.v[self.mmu.memory[self.pc - 2] & 0xF] = key
+        self.halted = False
+        return True
 
-        print("0x{:02x}".format(opcode))
-        breakpoint()
+    def timer_wait_loop(self, address):
+        '''
+        Returns (x, nn, skip_when_equal) if the code at address is a loop
+        polling the delay timer, otherwise None:
+
+            FX07    VX = delay timer
+            3XNN    skip if VX == NN (4XNN - skip if VX != NN)
+            1NNN    jump back to FX07
+        '''
+
+        memory = self.mmu.memory
+        if address + 6 > len(memory):
+            return None
+
+        x = memory[address] & 0xF
+        if memory[address] != 0xF0 | x or memory[address + 1] != 0x07:
+            return None
+
+        skip = memory[address + 2]
+        if skip != 0x30 | x and skip != 0x40 | x:
+            return None
+
+        if memory[address + 4] != 0x10 | (address >> 8) or \
+                memory[address + 5] != address & 0xFF:
+            return None
+
+        return x, memory[address + 3], skip >> 4 == 0x3
+
+    def idle_loop(self, address):
+        '''
+        Whether the code at address is a timer wait loop that can't exit
+        before the delay timer next ticks, so running it is wasted time
+        '''
+
+        loop = self.timer_wait_loop(address)
+        if loop is None:
+            return False
+
+        _, nn, skip_when_equal = loop
+        return (self.mmu.delay_timer == nn) != skip_when_equal
+
+    def skip_idle(self, cycles):
+        '''
+        Leaves the machine exactly as executing the given number of
+        instructions of the idle loop starting at pc would
+        '''
 
-        # Get the prefix and execute corresponding instruction
-        prefix = (opcode & 0xF000) >> 12
-        try:
-            self.primary_op_handlers[prefix](opcode)
-        except KeyError:
+        if cycles > 0:
+            x = self.mmu.memory[self.pc] & 0xF
+            self.mmu.v[x] = self.mmu.delay_timer
+            self.pc += 2 * (cycles % 3)
+
+    def fast_forward_idle(self):
+        '''
+        Spends what's left of the current run() in the idle loop at pc in
+        one go. The timers only tick between runs, so the loop can't exit
+        before then
+        '''
+
+        left = operator.length_hint(self.budget)
+        self.skip_idle(left)
+        self.skipped_cycles += left
+
+        # Use up the rest of the budget so run() returns
+        collections.deque(self.budget, maxlen=0)
+
+    def decode(self, op):
+        '''
+        Resolves an opcode to a callable that runs it. The handler is looked
+        up through the prefix tables and its operands (named x, y, n, nn or
+        nnn in its signature) are pulled out of the op up front
+        '''
+
+        prefix = op >> 12
+        if prefix in self.prefix_op_handlers:
+            mask, handlers = self.prefix_op_handlers[prefix]
+            handler = handlers.get(op & mask)
+        else:
+            handler = self.primary_op_handlers.get(prefix)
+
+        if handler is None:
             if prefix == 0:
-                # Not often used, 0x0NNN - Calls program at NNN
-                self.pc = self.pc & 0xFFF
+                handler = self.handle_machine_code_call_op
             else:
-                print("Unknown op encounter - %s", "{0:x}".format(opcode))
+                handler = self.handle_unknown_op
+
+        operands = [
+            OPERANDS[name](op)
+            for name in inspect.signature(handler).parameters
+        ]
+        return functools.partial(handler, *operands)
 
-    def handle_clear_screen_op(self, op):
+    def handle_unknown_op(self, op):
+        print("Unknown op encountered - {0:04x}".format(op))
+
+    def handle_machine_code_call_op(self, nnn):
+        '''
+        Instruction 0x0NNN - Calls machine code routine at NNN. Not often
+        used and not supported here, so this is a no-op
+        '''
+
+        self.pc = self.pc & 0xFFF
+
+    def handle_clear_screen_op(self):
         '''
         Instruction 0x00E0 - Clears the screen
         '''
 
         self.display.clear_screen()
 
-    def handle_return_op(self, op):
+    def handle_return_op(self):
         '''
         Instruction 0x00EE - Returns from a subroutine
         '''
@@ -115,356 +311,340 @@ class Cpu:
         address = self.stack.pop()
         self.pc = address
 
-    def handle_jump_op(self, op):
+    def handle_scroll_down_op(self, n):
         '''
-        Instruction 0x1NNN - Jump to NNN
+        Instruction 0x00CN - Scrolls the screen down N rows (SUPER-CHIP)
         '''
 
-        address = op & 0xFFF  # Gets the NNN part of op
-        self.pc = address
+        self.display.scroll_down(n)
+
+    def handle_scroll_right_op(self):
+        '''
+        Instruction 0x00FB - Scrolls the screen right 4 pixels (SUPER-CHIP)
+        '''
+
+        self.display.scroll_right(4)
+
+    def handle_scroll_left_op(self):
+        '''
+        Instruction 0x00FC - Scrolls the screen left 4 pixels (SUPER-CHIP)
+        '''
+
+        self.display.scroll_left(4)
+
+    def handle_exit_op(self):
+        '''
+        Instruction 0x00FD - Exits the interpreter (SUPER-CHIP). We stay on
+        this instruction, so the machine stops but the window stays up
+        '''
 
-    def handle_call_op(self, op):
+        self.pc -= 2
+
+    def handle_low_resolution_op(self):
+        '''
+        Instruction 0x00FE - Switches to the 64x32 display (SUPER-CHIP)
+        '''
+
+        self.display.set_resolution(*self.display.LORES)
+
+    def handle_high_resolution_op(self):
+        '''
+        Instruction 0x00FF - Switches to the 128x64 display (SUPER-CHIP)
+        '''
+
+        self.display.set_resolution(*self.display.HIRES)
+
+    def handle_jump_op(self, nnn):
+        '''
+        Instruction 0x1NNN - Jump to NNN. Jumping back to the start of a
+        delay timer wait loop that can't exit yet skips ahead to the next
+        timer tick
+        '''
+
+        if self.pc == nnn + 6 and self.idle_loop(nnn):
+            self.pc = nnn
+            self.fast_forward_idle()
+            return
+
+        self.pc = nnn
+
+    def handle_call_op(self, nnn):
         '''
         Instruction 0x2NNN - Call subroutine at NNN
         '''
 
         self.stack.append(self.pc)
-        self.handle_jump_op(op)
+        self.handle_jump_op(nnn)
 
-    def handle_truthy_value_condition_op(self, op):
+    def handle_truthy_value_condition_op(self, x, nn):
         '''
         Instruction 0x3XNN - Skip next instruction if VX equals NN
         '''
 
-        if self._register_x_equals_nn(op):
+        if self.mmu.v[x] == nn:
             self.pc += 2
 
-    def handle_falsey_value_condition_op(self, op):
+    def handle_falsey_value_condition_op(self, x, nn):
         '''
         Instruction 0x3XNN - Skip next instruction if VX doesn't equal NN
         '''
 
-        if not self._register_x_equals_nn(op):
+        if self.mmu.v[x] != nn:
             self.pc += 2
 
-    def handle_truthy_register_condition_op(self, op):
+    def handle_truthy_register_condition_op(self, x, y):
         '''
         Instruction 0x5XY0 - Skip next instruction if VX equals VY
         '''
 
-        if self._register_x_equals_register_y(op):
+        if self.mmu.v[x] == self.mmu.v[y]:
             self.pc += 2
 
-    def handle_set_register_to_value_op(self, op):
+    def handle_set_register_to_value_op(self, x, nn):
         '''
         Instruction 0x6XNN - Sets VX to NN
         '''
 
-        register = int_to_hex((op & 0xF00) >> 8)
-        value = op & 0xFF
-        self.mmu.write_register(register, value)
+        self.mmu.v[x] = nn
 
-    def handle_add_value_to_register_op(self, op):
+    def handle_add_value_to_register_op(self, x, nn):
         '''
         Instruction - 0x7XNN - Adds NN to VX (Do not set carry flag)
         '''
 
-        register = int_to_hex((op & 0xF00) >> 8)
-        value = op & 0xFF
-        self.mmu.write_register(
-            register,
-            self._do_add(
-                self.mmu.read_register(register),
-                value,
-                set_carry=False
-            )
-        )
+        v = self.mmu.v
+        v[x] = self._do_add(v[x], nn, set_carry=False)
 
-    def handle_assign_register_to_register_op(self, op):
+    def handle_assign_register_to_register_op(self, x, y):
         '''
         Instruction - 0x8XY0 - Set VX to value at VY
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        register_y = int_to_hex((op & 0xF0) >> 4)
-        self.mmu.write_register(
-            register_x,
-            self.mmu.read_register(register_y)
-        )
+        v = self.mmu.v
+        v[x] = v[y]
 
-    def handle_register_or_register_op(self, op):
+    def handle_register_or_register_op(self, x, y):
         '''
         Instruction - 0x8XY1 - Set VX to value of VX OR VY
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        register_y = int_to_hex((op & 0xF0) >> 4)
-        value = self.mmu.read_register(register_x) | \
-            self.mmu.read_register(register_y)
+        v = self.mmu.v
+        v[x] |= v[y]
 
-        self.mmu.write_register(register_x, value)
-
-    def handle_register_and_register_op(self, op):
+    def handle_register_and_register_op(self, x, y):
         '''
         Instruction - 0x8XY2 - Set VX to value of VX AND VY
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        register_y = int_to_hex((op & 0xF0) >> 4)
-        value = self.mmu.read_register(register_x) & \
-            self.mmu.read_register(register_y)
-
-        self.mmu.write_register(register_x, value)
+        v = self.mmu.v
+        v[x] &= v[y]
 
-    def handle_register_xor_register_op(self, op):
+    def handle_register_xor_register_op(self, x, y):
         '''
         Instruction - 0x8XY3 - Set VX to value of VX XOR VY
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        register_y = int_to_hex((op & 0xF0) >> 4)
-        value = self.mmu.read_register(register_x) ^ \
-            self.mmu.read_register(register_y)
+        v = self.mmu.v
+        v[x] ^= v[y]
 
-        self.mmu.write_register(register_x, value)
-
-    def handle_add_register_to_register_op(self, op):
+    def handle_add_register_to_register_op(self, x, y):
         '''
         Instruction - 0x8XY4 - Adds VY to VX and stores it in VX
         Stores carry flag as needed
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        register_y = int_to_hex((op & 0xF0) >> 4)
-        self.mmu.write_register(
-            register_x,
-            self._do_add(
-                self.mmu.read_register(register_x),
-                self.mmu.read_register(register_y),
-            )
-        )
+        v = self.mmu.v
+        v[x] = self._do_add(v[x], v[y])
 
-    def handle_subtract_register_y_from_register_x_op(self, op):
+    def handle_subtract_register_y_from_register_x_op(self, x, y):
         '''
         Instruction - 0x8XY5 - Subtracts VY from VX and stores in VX
         Stores carry flag as needed (borrow)
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        register_y = int_to_hex((op & 0xF0) >> 4)
-        self.mmu.write_register(
-            register_x,
-            self._do_subtract(
-                self.mmu.read_register(register_x),
-                self.mmu.read_register(register_y),
-            )
-        )
+        v = self.mmu.v
+        v[x] = self._do_subtract(v[x], v[y])
 
-    def handle_bit_shift_right_op(self, op):
+    def handle_bit_shift_right_op(self, x):
         '''
         Instruction - 0x8XY6 - Stores least significant bit of VX in VF
         and shifts VX right by 1
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        bit = self.mmu.read_register(register_x) & 0x1
-        self.mmu.write_register('F', bit)
-        self.mmu.write_register(
-            register_x,
-            self.mmu.read_register(register_x) >> 1
-        )
+        v = self.mmu.v
+        v[0xF] = v[x] & 0x1
+        v[x] = v[x] >> 1
 
-    def handle_subtract_register_x_from_register_y_op(self, op):
+    def handle_subtract_register_x_from_register_y_op(self, x, y):
         '''
         Instruction - 0x8XY7 - Subtracts VX from VY and stores in VX
         Stores carry flag as needed (borrow)
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        register_y = int_to_hex((op & 0xF0) >> 4)
-        self.mmu.write_register(
-            register_x,
-            self._do_subtract(
-                self.mmu.read_register(register_y),
-                self.mmu.read_register(register_x),
-            )
-        )
+        v = self.mmu.v
+        v[x] = self._do_subtract(v[y], v[x])
 
-    def handle_bit_shift_left_op(self, op):
+    def handle_bit_shift_left_op(self, x):
         '''
         Instruction - 0x8XYE - Stores least significant bit of VX in VF
         and shifts VX left by 1
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        bit = self.mmu.read_register(register_x) >> 7
-        self.mmu.write_register('F', bit)
-        self.mmu.write_register(
-            register_x,
-            (self.mmu.read_register(register_x) << 1) & 0xFF
-        )
+        v = self.mmu.v
+        v[0xF] = v[x] >> 7
+        v[x] = (v[x] << 1) & 0xFF
 
-    def handle_falsey_register_condition_op(self, op):
+    def handle_falsey_register_condition_op(self, x, y):
         '''
         Instruction 0x9XY0 - Skip next instruction if VX deosn't equal VY
         '''
 
-        if not self._register_x_equals_register_y(op):
+        if self.mmu.v[x] != self.mmu.v[y]:
             self.pc += 1
 
-    def handle_address_register_to_value_op(self, op):
+    def handle_address_register_to_value_op(self, nnn):
         '''
         Instruction 0xANNN - Sets I to address NNN
         '''
 
-        address = op & 0xFFF  # Gets the NNN part of op
-        self.mmu.write_address_register(address)
+        self.mmu.write_address_register(nnn)
 
-    def handle_jump_with_offset_op(self, op):
+    def handle_jump_with_offset_op(self, nnn):
         '''
         Instruction 0xBNNN - Jump to address NNN plus value at V0
         '''
 
-        value = self.mmu.read_register('0')
-        address = (op & 0xFFF) + value
-        self.pc = address
+        self.pc = nnn + self.mmu.v[0]
 
-    def handle_set_register_to_random_bitwise_value_op(self, op):
+    def handle_set_register_to_random_bitwise_value_op(self, x, nn):
         '''
         Instruction 0xCXNN - Set VX to result of bitwise AND of NN and
         random number from 0-255
         '''
 
-        register = int_to_hex((op & 0xF00) >> 8)
-        value = op & 0xFF
-        rand = random.randint(0, 255)
-        self.mmu.write_register(register, value & rand)
+        rand = self.random.randint(0, 255)
+        self.mmu.v[x] = nn & rand
 
-    def handle_draw_sprite_op(self, op):
+    def handle_draw_sprite_op(self, x, y, n):
         '''
         Instruction 0xDXYN - Draws a sprite at coordinate (VX, VY) with a
         width of 8 pixels, and a height of N pixels. Each row is bit-coded,
         read from memory location I. VF is set if any pixels are set from set
-        to unset, and to 0 if not
-        '''
-
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        register_y = int_to_hex((op & 0xF0) >> 4)
-
-        width = 8
-        height = op & 0xF
-        x_pos = self.mmu.read_register(register_x)
-        y_pos = self.mmu.read_register(register_y)
-
-        sprite_location = self.mmu.read_address_register()
-        did_flip = False
-
-        for row in range(height):
-            # For each row, get the value at current sprite location
-            # starting at the address register (I) and then get each
-            # bit for the pixel value
-            value = self.mmu.read(sprite_location)
-            for column in range(width - 1, -1, -1):
-                pixel = (value >> column) & 1  # Get the pixel, left to right
-
-                # Set the pixel
-                did_flip = self.display.set_pixel(
-                    x_pos + width - column - 1,
-                    y_pos + row,
-                    pixel
-                ) or did_flip
-
-            sprite_location += 1
+        to unset, and to 0 if not. DXY0 draws a 16x16 sprite of two bytes
+        per row instead (SUPER-CHIP)
+        '''
+
+        # Each sprite row is one byte (or two), drawn with a single XOR onto
+        # the packed framebuffer
+        location = self.mmu.read_address_register()
+        if n == 0:
+            data = self.mmu.memory[location:location + 32]
+            collided = self.display.draw_sprite(
+                self.mmu.v[x],
+                self.mmu.v[y],
+                [
+                    (data[i] << 8) | data[i + 1]
+                    for i in range(0, len(data) - 1, 2)
+                ],
+                sprite_width=16
+            )
+        else:
+            collided = self.display.draw_sprite(
+                self.mmu.v[x],
+                self.mmu.v[y],
+                self.mmu.memory[location:location + n]
+            )
 
-        # Set VF it we flipped any pixels
-        self.mmu.write_register('F', 1 if did_flip else 0)
+        # Set VF if we unset any pixels
+        self.mmu.v[0xF] = 1 if collided else 0
 
-    def handle_key_pressed_skip_op(self, op):
+    def handle_key_pressed_skip_op(self, x):
         '''
         Instruction 0xEX9E - Skips next instruction if key stored in VX is
         pressed
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        key = self.mmu.read_register(register_x)
+        key = self.mmu.v[x]
         if self.keyboard.is_pressed(key):
             self.pc += 2
 
-    def handle_key_not_pressed_skip_op(self, op):
+    def handle_key_not_pressed_skip_op(self, x):
         '''
         Instruction 0xEXA1 - Skips next instruction if key stored in VX is
         not pressed
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        key = self.mmu.read_register(register_x)
+        key = self.mmu.v[x]
         if not self.keyboard.is_pressed(key):
             self.pc += 2
 
-    def handle_set_register_to_delay_timer_op(self, op):
+    def handle_set_register_to_delay_timer_op(self, x):
         '''
         Instruction 0xFX07 - Sets VX to the value of the delay timer
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        self.mmu.write_register(register_x, self.mmu.delay_timer)
+        self.mmu.v[x] = self.mmu.delay_timer
 
-    def handle_key_press_await_op(self, op):
+    def handle_key_press_await_op(self, x):
         '''
-        Instruction 0xFX0A - A key press is awaited and then stored in VX
+        Instruction 0xFX0A - A key press is awaited and then stored in VX.
+        Until then the Cpu is halted and executes nothing
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
         self.halted = True
-        key = self.keyboard.get_pressed()
-        if key is not None:
-            self.mmu.write_register(register_x, key)
-            self.halted = False
+        self.poll_key()
 
-    def handle_set_delay_timer_to_register_op(self, op):
+    def handle_set_delay_timer_to_register_op(self, x):
         '''
         Instruction 0xFX15 - Sets delay timer to value of VX
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        self.mmu.delay_timer = self.mmu.read_register(register_x)
+        self.mmu.delay_timer = self.mmu.v[x]
 
-    def handle_set_sound_timer_to_register_op(self, op):
+    def handle_set_sound_timer_to_register_op(self, x):
         '''
         Instruction 0xFX18 - Sets sound timer to value of VX
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        self.mmu.sound_timer = self.mmu.read_register(register_x)
+        self.mmu.sound_timer = self.mmu.v[x]
 
-    def handle_add_register_to_address_op(self, op):
+    def handle_add_register_to_address_op(self, x):
         '''
         Instruction 0xFX1E - Adds VX to I. If we overflow range of
         memory (i.e. I + VX > 0xFFF) set VF to 1, 0 otherwise
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
         result = self.mmu.read_address_register() + \
-            self.mmu.read_register(register_x)
+            self.mmu.v[x]
 
         if result > 0xFFF:
             result -= 0x100  # Overflow back around
-            self.mmu.write_register('F', 1)
+            self.mmu.v[0xF] = 1
         else:
-            self.mmu.write_register('F', 0)
+            self.mmu.v[0xF] = 0
 
         self.mmu.write_address_register(result)
 
-    def handle_set_address_to_sprite_location_op(self, op):
+    def handle_set_address_to_sprite_location_op(self, x):
         '''
         Instruction 0xFX29 - Sets I to location of the sprite for
         character in VX - characters 0-F represented by 4x5 font
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        self.mmu.write_address_register(self.mmu.read_register(register_x) * 5)
+        self.mmu.write_address_register(self.mmu.v[x] * 5)
 
-    def handle_set_bcd_op(self, op):
+    def handle_set_address_to_big_sprite_location_op(self, x):
+        '''
+        Instruction 0xFX30 - Sets I to location of the 8x10 sprite for
+        the digit in VX (SUPER-CHIP)
+        '''
+
+        self.mmu.load_big_font()
+        self.mmu.write_address_register(
+            self.mmu.BIG_FONT_START + self.mmu.v[x] * 10
+        )
+
+    def handle_set_bcd_op(self, x):
         '''
         Instruction 0xFX33 - Stores the binary coded decimal represetnation
         of VX, with the most significant of the three digits at
@@ -472,8 +652,7 @@ class Cpu:
         significant digit at I + 2
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        bcd = self.mmu.read_register(register_x)
+        bcd = self.mmu.v[x]
 
         self.mmu.write(self.mmu.read_address_register(), int(bcd / 100))
         self.mmu.write(
@@ -482,60 +661,44 @@ class Cpu:
         )
         self.mmu.write(self.mmu.read_address_register() + 2, int(bcd % 10))
 
-    def handle_store_registers_in_address_op(self, op):
+    def handle_store_registers_in_address_op(self, x):
         '''
         Instruction 0xFX55 - Stores V0 - VX including VX in memory starting
         at address I - I is left unchanges
         '''
 
-        register_x = (op & 0xF00) >> 8
-        for i in range(register_x + 1):
+        for i in range(x + 1):
             self.mmu.write(
                 self.mmu.read_address_register() + i,
-                self.mmu.read_register(int_to_hex(i))
+                self.mmu.v[i]
             )
 
-    def handle_fill_registers_from_address_op(self, op):
+    def handle_fill_registers_from_address_op(self, x):
         '''
         Instruction 0xFX65 - Fills V0 - VX including VX in memory starting
         at address I - I is left unchanges
         '''
 
-        register_x = (op & 0xF00) >> 8
-        for i in range(register_x + 1):
-            self.mmu.write_register(
-                int_to_hex(i),
-                self.mmu.read(self.mmu.read_address_register() + i)
+        for i in range(x + 1):
+            self.mmu.v[i] = self.mmu.read(
+                self.mmu.read_address_register() + i
             )
 
-    def _get_op(self):
-        first = self.mmu.read(self.pc)
-        self.pc += 1
-        second = self.mmu.read(self.pc)
-        self.pc += 1
-
-        return (first << 8) | second
-
-    def _register_x_equals_nn(self, op):
+    def handle_store_registers_in_flags_op(self, x):
         '''
-        Returns true if value at register X equals NN
-        OP is in form: 0xZXNN
+        Instruction 0xFX75 - Stores V0 - VX including VX in the RPL user
+        flags (SUPER-CHIP)
         '''
 
-        register = int_to_hex((op & 0xF00) >> 8)
-        value = op & 0xFF
-        return self.mmu.read_register(register) == value
+        self.mmu.flags[:x + 1] = self.mmu.v[:x + 1]
 
-    def _register_x_equals_register_y(self, op):
+    def handle_fill_registers_from_flags_op(self, x):
         '''
-        Returns true if value at register X equals value at register Y
-        OP is in form: 0xZXY0
+        Instruction 0xFX85 - Fills V0 - VX including VX from the RPL user
+        flags (SUPER-CHIP)
         '''
 
-        register_x = int_to_hex((op & 0xF00) >> 8)
-        register_y = int_to_hex((op & 0xF0) >> 4)
-        return self.mmu.read_register(register_x) == \
-            self.mmu.read_register(register_y)
+        self.mmu.v[:x + 1] = self.mmu.flags[:x + 1]
 
     def _do_add(self, v1, v2, set_carry=True):
         val = v1 + v2
@@ -546,10 +709,10 @@ class Cpu:
         if val > 0xFF:
             val -= 0x100  # Overflows back around
             if set_carry:
-                self.mmu.write_register('F', 1)
+                self.mmu.v[0xF] = 1
 
         elif set_carry:
-            self.mmu.write_register('F', 0)
+            self.mmu.v[0xF] = 0
 
         return val
 
@@ -564,12 +727,12 @@ class Cpu:
         if val < 0:
             val += 0x100
             if set_borrow:
-                self.mmu.write_register('F', 1)
+                self.mmu.v[0xF] = 1
 
         elif set_borrow:
-            self.mmu.write_register('F', 0)
+            self.mmu.v[0xF] = 0
 
         return val
 
     def test(self):
-        self.primary_op_handlers[0x1](0x1DDD)
+        self.decoded[0x1DDD]()
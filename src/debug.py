@@ -0,0 +1,116 @@
+import time
+
+import pygame
+
+
+class DebugPanel:
+    '''
+    Debug overlay drawn below the screen - registers V0 - VF in one column,
+    and pc, I, stack depth, timers and instructions per second in another.
+
+    The panel refreshes at its own rate rather than per instruction or
+    frame, and a line is only re-rendered when its text changes. Rendered
+    labels are cached by text, so values that come back around cost a
+    dict lookup
+    '''
+
+    LINE_HEIGHT = 20
+    MARGIN = 10
+    REFRESH_RATE = 10  # Hz
+    MAX_CACHED_LABELS = 1024
+
+    COLOR = (255, 255, 255)
+    BACKGROUND = (0, 0, 0)
+
+    def __init__(
+        self,
+        cpu,
+        scheduler,
+        surface,
+        font,
+        top,
+        refresh_rate=REFRESH_RATE
+    ):
+        self.cpu = cpu
+        self.mmu = cpu.mmu
+        self.scheduler = scheduler
+        self.surface = surface
+        self.font = font
+        self.refresh_interval = 1 / refresh_rate
+
+        # Left column is registers, right column everything else
+        column_width = surface.get_width() // 2
+        rows = [top + self.MARGIN + i * self.LINE_HEIGHT for i in range(16)]
+        self.positions = [(self.MARGIN, y) for y in rows] + \
+            [(column_width + self.MARGIN, y) for y in rows[:6]]
+        self.line_size = (column_width - self.MARGIN, self.LINE_HEIGHT)
+
+        self.texts = [None] * len(self.positions)
+        self.labels = {}
+
+        self._next_refresh = 0
+        self._last_cycles = 0
+        self._last_time = None
+        self._ips = 0
+
+    @classmethod
+    def height(cls):
+        return 16 * cls.LINE_HEIGHT + 2 * cls.MARGIN
+
+    def render(self, now=None):
+        '''
+        Redraws the lines whose text changed, if a refresh is due, and
+        returns the rects that were drawn to
+        '''
+
+        if now is None:
+            now = time.perf_counter()
+
+        if now < self._next_refresh:
+            return []
+
+        self._next_refresh = now + self.refresh_interval
+        self._update_ips(now)
+
+        rects = []
+        for i, text in enumerate(self._lines()):
+            if self.texts[i] == text:
+                continue
+
+            self.texts[i] = text
+            rect = pygame.Rect(self.positions[i], self.line_size)
+            self.surface.fill(self.BACKGROUND, rect)
+            self.surface.blit(self._label(text), rect)
+            rects.append(rect)
+
+        return rects
+
+    def _lines(self):
+        v = self.mmu.v
+        lines = ["V%X - %02x" % (i, v[i]) for i in range(16)]
+        lines.append("PC - %03x" % self.cpu.pc)
+        lines.append("I  - %03x" % self.mmu.address_register)
+        lines.append("SP - %d" % len(self.cpu.stack))
+        lines.append("DT - %02x" % self.mmu.delay_timer)
+        lines.append("ST - %02x" % self.mmu.sound_timer)
+        lines.append("IPS - %d" % self._ips)
+        return lines
+
+    def _label(self, text):
+        label = self.labels.get(text)
+        if label is None:
+            if len(self.labels) >= self.MAX_CACHED_LABELS:
+                self.labels.clear()
+
+            label = self.font.render(text, 1, self.COLOR, self.BACKGROUND)
+            self.labels[text] = label
+
+        return label
+
+    def _update_ips(self, now):
+        cycles = self.scheduler.cycles
+        if self._last_time is not None and now > self._last_time:
+            self._ips = (cycles - self._last_cycles) / (now - self._last_time)
+
+        self._last_cycles = cycles
+        self._last_time = now
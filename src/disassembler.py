@@ -0,0 +1,106 @@
+# Mnemonics by the same prefix tables the Cpu decodes with. Operands are
+# filled in with str.format from the fields of the op
+PRIMARY_MNEMONICS = {
+    0x1: 'JP {nnn:03X}',
+    0x2: 'CALL {nnn:03X}',
+    0x3: 'SE V{x:X}, {nn:02X}',
+    0x4: 'SNE V{x:X}, {nn:02X}',
+    0x5: 'SE V{x:X}, V{y:X}',
+    0x6: 'LD V{x:X}, {nn:02X}',
+    0x7: 'ADD V{x:X}, {nn:02X}',
+    0x9: 'SNE V{x:X}, V{y:X}',
+    0xA: 'LD I, {nnn:03X}',
+    0xB: 'JP V0, {nnn:03X}',
+    0xC: 'RND V{x:X}, {nn:02X}',
+    0xD: 'DRW V{x:X}, V{y:X}, {n:X}',
+}
+
+ZERO_PREFIX_MNEMONICS = {
+    0x0E0: 'CLS',
+    0x0EE: 'RET',
+    0x0FB: 'SCR',
+    0x0FC: 'SCL',
+    0x0FD: 'EXIT',
+    0x0FE: 'LOW',
+    0x0FF: 'HIGH',
+}
+ZERO_PREFIX_MNEMONICS.update((0x0C0 | n, 'SCD {n:X}') for n in range(0x10))
+
+EIGHT_PREFIX_MNEMONICS = {
+    0x0: 'LD V{x:X}, V{y:X}',
+    0x1: 'OR V{x:X}, V{y:X}',
+    0x2: 'AND V{x:X}, V{y:X}',
+    0x3: 'XOR V{x:X}, V{y:X}',
+    0x4: 'ADD V{x:X}, V{y:X}',
+    0x5: 'SUB V{x:X}, V{y:X}',
+    0x6: 'SHR V{x:X}',
+    0x7: 'SUBN V{x:X}, V{y:X}',
+    0xE: 'SHL V{x:X}',
+}
+
+E_PREFIX_MNEMONICS = {
+    0x9E: 'SKP V{x:X}',
+    0xA1: 'SKNP V{x:X}',
+}
+
+F_PREFIX_MNEMONICS = {
+    0x07: 'LD V{x:X}, DT',
+    0x0A: 'LD V{x:X}, K',
+    0x15: 'LD DT, V{x:X}',
+    0x18: 'LD ST, V{x:X}',
+    0x1E: 'ADD I, V{x:X}',
+    0x29: 'LD F, V{x:X}',
+    0x30: 'LD HF, V{x:X}',
+    0x33: 'LD B, V{x:X}',
+    0x55: 'LD [I], V{x:X}',
+    0x65: 'LD V{x:X}, [I]',
+    0x75: 'LD R, V{x:X}',
+    0x85: 'LD V{x:X}, R',
+}
+
+PREFIX_MNEMONICS = {
+    0x0: (0xFFF, ZERO_PREFIX_MNEMONICS),
+    0x8: (0xF, EIGHT_PREFIX_MNEMONICS),
+    0xE: (0xFF, E_PREFIX_MNEMONICS),
+    0xF: (0xFF, F_PREFIX_MNEMONICS),
+}
+
+
+def disassemble(op):
+    '''
+    Returns the assembly for a 16-bit opcode, e.g. 0x6A02 is "LD VA, 02".
+    Anything the Cpu doesn't know comes back as a raw data word
+    '''
+
+    prefix = op >> 12
+    if prefix in PREFIX_MNEMONICS:
+        mask, mnemonics = PREFIX_MNEMONICS[prefix]
+        mnemonic = mnemonics.get(op & mask)
+    else:
+        mnemonic = PRIMARY_MNEMONICS.get(prefix)
+
+    if mnemonic is None:
+        if prefix == 0:
+            mnemonic = 'SYS {nnn:03X}'
+        else:
+            mnemonic = 'DW {op:04X}'
+
+    return mnemonic.format(
+        op=op,
+        x=(op & 0xF00) >> 8,
+        y=(op & 0xF0) >> 4,
+        n=op & 0xF,
+        nn=op & 0xFF,
+        nnn=op & 0xFFF
+    )
+
+
+def disassemble_rom(rom, start=0x200):
+    '''
+    Yields (address, op, assembly) for every word of the ROM, as it would
+    be laid out in memory from start
+    '''
+
+    for offset in range(0, len(rom) - 1, 2):
+        op = (rom[offset] << 8) | rom[offset + 1]
+        yield start + offset, op, disassemble(op)
@@ -1,38 +1,137 @@
 class Display:
+    '''
+    Monochrome framebuffer, packed one int per scanline. Pixel x of a row
+    is bit (width - 1 - x), so the leftmost pixel is the most significant
+    bit and a sprite row can be drawn with a single shift and XOR
+    '''
 
-    def __init__(self):
-        self.width = 64
-        self.height = 32
+    # Resolutions - SUPER-CHIP's 00FE and 00FF switch between them
+    LORES = (64, 32)
+    HIRES = (128, 64)
+
+    def __init__(self, width=LORES[0], height=LORES[1]):
+        self.width = width
+        self.height = height
 
         self.clear_screen()
 
+    def set_resolution(self, width, height):
+        '''
+        Switches to a new resolution, which clears the screen
+        '''
+
+        self.width = width
+        self.height = height
+        self.clear_screen()
+
     def clear_screen(self):
-        self.screen = [
-            [0 for y in range(self.height)] for x in range(self.width)
-        ]
+        self.rows = [0] * self.height
+        self.row_mask = (1 << self.width) - 1
+
+        # Everything needs redrawing after a clear, so there's no point
+        # tracking individual rows until the next frame is rendered
+        self.full_redraw = True
+        self.changed = {}
+
+    def draw_sprite(self, x, y, sprite, sprite_width=8):
+        '''
+        XORs sprite (a sequence of row bit patterns, sprite_width bits each)
+        onto the screen with its top left corner at (x, y), wrapping around
+        the edges. Returns True if any set pixel was unset (a collision)
+        '''
+
+        width = self.width
+        height = self.height
+        rows = self.rows
+        changed = self.changed
+        x %= width
+
+        collided = False
+        for i, bits in enumerate(sprite):
+            # Line the sprite up with the left edge of the screen, then
+            # rotate it right by x so anything past the right edge wraps
+            placed = bits << (width - sprite_width)
+            placed = ((placed >> x) | (placed << (width - x))) & \
+                self.row_mask
+            if not placed:
+                continue
+
+            row_y = (y + i) % height
+            row = rows[row_y]
+            if row & placed:
+                collided = True
+
+            rows[row_y] = row ^ placed
+            if not self.full_redraw:
+                changed[row_y] = changed.get(row_y, 0) | placed
+
+        return collided
+
+    def scroll_down(self, n):
+        '''
+        Moves every row down n rows, blanking the rows scrolled in
+        '''
+
+        n = min(n, self.height)
+        self.rows = [0] * n + self.rows[:self.height - n]
+        self._scrolled()
+
+    def scroll_right(self, n):
+        self.rows = [row >> n for row in self.rows]
+        self._scrolled()
+
+    def scroll_left(self, n):
+        row_mask = self.row_mask
+        self.rows = [(row << n) & row_mask for row in self.rows]
+        self._scrolled()
 
     def set_pixel(self, x, y, value):
-        actual_x = x if x < self.width else x - self.width
-        actual_y = y if y < self.height else y - self.height
+        bit = 1 << (self.width - 1 - x % self.width)
+        y %= self.height
 
-        original = self.screen[actual_x][actual_y]
+        original = self.rows[y] & bit
 
         # We flip the color of the screen pixel if sprite
         # pixel is set
-        new_val = original ^ value
-        self.screen[actual_x][actual_y] = new_val
+        if value:
+            self.rows[y] ^= bit
+            if not self.full_redraw:
+                self.changed[y] = self.changed.get(y, 0) | bit
 
         # Return if we flipped the screen pixel or not
-        return original != new_val
+        return original != self.rows[y] & bit
+
+    def take_changes(self):
+        '''
+        Returns what changed since the last call as (full_redraw, changed),
+        where changed maps a row to a mask of its changed pixels, and starts
+        tracking afresh
+        '''
+
+        changes = self.full_redraw, self.changed
+        self.full_redraw = False
+        self.changed = {}
+        return changes
 
     def get_pixel(self, x, y):
-        return self.screen[x][y]
+        return (self.rows[y] >> (self.width - 1 - x)) & 1
 
     def get_set_pixels(self):
         pixels = []
-        for x in range(self.width):
-            for y in range(self.height):
-                if self.screen[x][y] == 1:
+        for y in range(self.height):
+            row = self.rows[y]
+            x = self.width - 1
+            while row:
+                if row & 1:
                     pixels.append((x, y))
 
+                row >>= 1
+                x -= 1
+
         return pixels
+
+    def _scrolled(self):
+        # A scroll moves every pixel, so tracking changes per row is no
+        # cheaper than redrawing
+        self.full_redraw = True
+        self.changed = {}
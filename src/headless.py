@@ -0,0 +1,254 @@
+import asyncio
+import time
+
+from buzzer import Buzzer, NullBackend
+from compiler import CompiledEngine
+from cpu import Cpu
+from display import Display
+from mmu import Mmu
+from scheduler import Scheduler
+from translator import BlockTranslator
+
+
+# Execution engines - each is built from a Cpu and has run(cycles)
+ENGINES = {
+    'interpreter': lambda cpu: cpu,
+    'translator': BlockTranslator,
+    'aot': CompiledEngine,
+}
+
+
+class HeadlessKeyboard:
+    '''
+    Keyboard used when running without pygame. Key state is held as a
+    16-bit mask (bit N set means key N is down) and is driven by the
+    caller instead of being polled from a window
+    '''
+
+    def __init__(self):
+        self._state = 0
+
+        # Called with no arguments whenever the key state changes
+        self.change_listeners = []
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        if state != self._state:
+            self._state = state
+            for listener in self.change_listeners:
+                listener()
+
+    def press(self, key):
+        self.state |= 1 << key
+
+    def release(self, key):
+        self.state &= ~(1 << key)
+
+    def is_pressed(self, key_to_check):
+        return (self._state >> key_to_check) & 1 == 1
+
+    def get_pressed(self):
+        # Lowest key that is down
+        state = self._state
+        if state:
+            return (state & -state).bit_length() - 1
+
+        return None
+
+
+class HeadlessChip8:
+    '''
+    Runs a ROM without a window, as fast as the host allows. Timers are
+    driven from emulated time by the Scheduler rather than from a wall clock.
+    engine is a name from ENGINES, or a callable building one from the Cpu
+    '''
+
+    def __init__(
+        self,
+        rom,
+        instructions_per_frame=Scheduler.INSTRUCTIONS_PER_FRAME,
+        engine='interpreter',
+        seed=None
+    ):
+        self.display = Display()
+        self.keyboard = HeadlessKeyboard()
+        self.mmu = Mmu()
+
+        self.mmu.load_rom(rom)
+        self.cpu = Cpu(self.mmu, self.display, self.keyboard, seed=seed)
+        if not callable(engine):
+            engine = ENGINES[engine]
+        self.engine = engine(self.cpu)
+        self.scheduler = Scheduler(
+            self.engine,
+            self.mmu,
+            instructions_per_frame=instructions_per_frame
+        )
+
+        self.buzzer = Buzzer(self.mmu, NullBackend())
+        self.scheduler.tick_listeners.append(self.buzzer.update)
+
+        self.running = False
+        self._wake = None  # Set to end an idle wait in run_async()
+
+        # Frames play_inputs() changes the keys at
+        self._input_frames = set()
+
+    def play_inputs(self, inputs):
+        '''
+        Drives the keyboard from inputs, which maps a frame number to the
+        16-bit key mask held from the start of that frame on
+        '''
+
+        inputs = dict(inputs)
+        self._input_frames.update(inputs)
+        self.keyboard.state = inputs.get(self.frames, self.keyboard.state)
+
+        def apply_inputs():
+            if self.frames in inputs:
+                self.keyboard.state = inputs[self.frames]
+
+        self.scheduler.frame_listeners.append(apply_inputs)
+
+    @property
+    def cycles(self):
+        return self.scheduler.cycles
+
+    @property
+    def frames(self):
+        return self.scheduler.frames
+
+    def run(self, cycles=None, frames=None):
+        '''
+        Executes the given number of instructions, or of whole frames, and
+        returns a report of the run and the final machine state
+        '''
+
+        if (cycles is None) == (frames is None):
+            raise ValueError("Exactly one of cycles or frames is required")
+
+        start_cycles = self.cycles
+        started = time.perf_counter()
+
+        if frames is not None:
+            self.scheduler.run_frames(frames)
+        else:
+            self.scheduler.run_cycles(cycles)
+
+        elapsed = time.perf_counter() - started
+
+        return self.report(self.cycles - start_cycles, elapsed)
+
+    async def run_async(self, frames=None):
+        '''
+        Runs the machine in real time as a coroutine, yielding to the event
+        loop between frames, until stop() is called or at least the given
+        number of frames have run. Returns a report of the run.
+
+        Many machines can share one event loop. One halted in FX0A with its
+        timers stopped doesn't run frames as they come, but sleeps until the
+        keys change, stop() is called or the last frame is due. The frames
+        that went by are then skipped without running the Cpu, so a key
+        pressed while it slept takes effect from the next frame on
+        '''
+
+        wake = asyncio.Event()
+        self._wake = wake
+        self.keyboard.change_listeners.append(wake.set)
+
+        last_frame = None if frames is None else self.frames + frames
+        start_cycles = self.cycles
+        started = time.perf_counter()
+
+        self.running = True
+        self.scheduler.resync()
+        try:
+            while self.running:
+                if self._idle():
+                    await self._wait_idle(wake, last_frame)
+                else:
+                    self.scheduler.tick()
+
+                if last_frame is not None and self.frames >= last_frame:
+                    break
+
+                await asyncio.sleep(self.scheduler.time_until_next_frame())
+        finally:
+            self.running = False
+            self._wake = None
+            self.keyboard.change_listeners.remove(wake.set)
+
+        elapsed = time.perf_counter() - started
+
+        return self.report(self.cycles - start_cycles, elapsed)
+
+    def stop(self):
+        '''
+        Ends run_async() after the current frame
+        '''
+
+        self.running = False
+        if self._wake is not None:
+            self._wake.set()
+
+    def report(self, cycles, elapsed):
+        ips = cycles / elapsed if elapsed > 0 else float('inf')
+        return {
+            'cycles': cycles,
+            'seconds': elapsed,
+            'instructions_per_second': ips,
+            'state': self.state(),
+        }
+
+    def state(self):
+        return {
+            'cycles': self.cycles,
+            'frames': self.frames,
+            'pc': self.cpu.pc,
+            'I': self.mmu.read_address_register(),
+            'registers': dict(self.mmu.registers),
+            'stack': list(self.cpu.stack),
+            'delay_timer': self.mmu.delay_timer,
+            'sound_timer': self.mmu.sound_timer,
+            'halted': self.cpu.halted,
+        }
+
+    async def _wait_idle(self, wake, last_frame):
+        frame_time = self.scheduler.frame_time
+
+        # Wake up in time for the last frame or the next played input,
+        # whichever comes first
+        upcoming = [
+            frame for frame in self._input_frames if frame > self.frames
+        ]
+        if last_frame is not None:
+            upcoming.append(last_frame)
+        until = min(upcoming) if upcoming else None
+
+        timeout = None
+        if until is not None:
+            timeout = (until - self.frames) * frame_time
+
+        idle_since = time.perf_counter()
+        try:
+            await asyncio.wait_for(wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        wake.clear()
+
+        frames = int((time.perf_counter() - idle_since) / frame_time)
+        if until is not None:
+            frames = min(frames, until - self.frames)
+
+        self.scheduler.skip_frames(frames)
+        self.scheduler.resync()
+
+    def _idle(self):
+        return self.cpu.halted and \
+            self.keyboard.state == 0 and \
+            self.mmu.delay_timer == 0 and \
+            self.mmu.sound_timer == 0
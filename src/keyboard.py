@@ -34,14 +34,30 @@ class Keyboard:
             0xF: pygame.K_v,
         }
 
-    def is_pressed(self, key_to_check):
+        # Bit N is set while key N is down - see update()
+        self.state = 0
+
+    def update(self):
+        '''
+        Reads the key state from pygame. Called once a frame from the event
+        loop, so every instruction in a frame sees the same keys
+        '''
+
         keys_pressed = pygame.key.get_pressed()
-        return keys_pressed[self.key_mappings[key_to_check]]
+        state = 0
+        for k, key in self.key_mappings.items():
+            if keys_pressed[key]:
+                state |= 1 << k
+
+        self.state = state
+
+    def is_pressed(self, key_to_check):
+        return (self.state >> key_to_check) & 1 == 1
 
     def get_pressed(self):
-        keys_pressed = pygame.key.get_pressed()
-        for k in self.key_mappings.keys():
-            if keys_pressed[self.key_mappings[k]]:
-                return k
+        # Lowest key that is down
+        state = self.state
+        if state:
+            return (state & -state).bit_length() - 1
 
         return None
@@ -0,0 +1,65 @@
+import hashlib
+import os
+
+ROM_START = 0x200
+MAX_ROM_SIZE = 0x1000 - ROM_START
+
+# ROM images by SHA-1 of their contents, and the stat of each path already
+# read so unchanged files aren't read again
+_images = {}
+_paths = {}
+
+
+def load_rom(path):
+    '''
+    Reads a ROM file in one call and returns its image as bytes. Images are
+    cached in process, so loading an unchanged file again costs a stat
+    '''
+
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _paths.get(path)
+    if cached is not None and cached[0] == key:
+        return _images[cached[1]]
+
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    image = cache_rom(data)
+    _paths[path] = (key, rom_hash(image))
+    return image
+
+
+def cache_rom(data):
+    '''
+    Validates a ROM image and returns the cached copy of it, so identical
+    images loaded from anywhere share one bytes object
+    '''
+
+    validate_rom(data)
+
+    digest = rom_hash(data)
+    image = _images.get(digest)
+    if image is None:
+        image = _images[digest] = bytes(data)
+
+    return image
+
+
+def rom_hash(data):
+    return hashlib.sha1(bytes(data)).hexdigest()
+
+
+def validate_rom(data):
+    if not data:
+        raise ValueError("ROM is empty")
+
+    if len(data) > MAX_ROM_SIZE:
+        raise ValueError(
+            "ROM is %d bytes, only %d fit between 0x%03X and 0xFFF" % (
+                len(data),
+                MAX_ROM_SIZE,
+                ROM_START
+            )
+        )
@@ -1,16 +1,262 @@
-from chip8 import Chip8
+import argparse
+import os
+import sys
+
+import loader
 
 
 def load_rom(rom):
-    with open("rom/%s" % rom, "rb") as f:
-        data = []
-        for byte in iter(lambda: f.read(1), b''):
-            data.append(byte)
+    return loader.load_rom(os.path.join("rom", rom))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Chip-8 emulator")
+    parser.add_argument("rom", nargs="?", default="PONG")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Run without a window and print a report when done"
+    )
+    parser.add_argument("--cycles", type=int, help="Instructions to execute")
+    parser.add_argument("--frames", type=int, help="60 Hz frames to execute")
+    parser.add_argument(
+        "--instructions-per-frame",
+        type=int,
+        default=10,
+        help="Instructions executed per 60 Hz frame"
+    )
+    parser.add_argument(
+        "--renderer",
+        choices=("auto", "rects", "surfarray"),
+        default="auto",
+        help="Renderer for windowed runs - surfarray needs NumPy"
+    )
+    parser.add_argument("--scale", type=int, default=10)
+    parser.add_argument(
+        "--no-debug",
+        action="store_true",
+        help="Hide the debug panel in windowed runs"
+    )
+    parser.add_argument(
+        "--no-sound",
+        action="store_true",
+        help="Don't sound the buzzer in windowed runs"
+    )
+    # Both work by shadowing Cpu.execute, so only one can be on at once
+    tools = parser.add_mutually_exclusive_group()
+    tools.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="Profile a headless interpreter run, writing JSON to PATH and "
+             "folded stacks to PATH.folded"
+    )
+    tools.add_argument(
+        "--trace",
+        metavar="PATH",
+        help="Trace the last instructions of a headless interpreter run to "
+             "PATH, written at the end of the run or when it fails"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="Seed for CXNN random numbers, for reproducible runs"
+    )
+    parser.add_argument(
+        "--record",
+        metavar="PATH",
+        help="Record the windowed session's inputs to a movie at PATH"
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="PATH",
+        help="Replay a movie headless as fast as possible and check it "
+             "ends in the recorded state"
+    )
+    parser.add_argument(
+        "--sessions",
+        type=int,
+        metavar="N",
+        help="Run N headless sessions in real time on one asyncio event "
+             "loop for --frames frames and print a report for each"
+    )
+    parser.add_argument(
+        "--engine",
+        choices=("interpreter", "translator", "aot"),
+        default="interpreter",
+        help="Execution engine for headless runs"
+    )
+
+    args = parser.parse_args()
+    if args.profile or args.trace:
+        # Only plain headless runs are profiled or traced, and the other
+        # engines run blocks without calling Cpu.execute, so anything else
+        # would have nothing to report
+        if not args.headless or args.sessions or args.replay:
+            parser.error(
+                "--profile and --trace need --headless, without --sessions "
+                "or --replay"
+            )
+        if args.engine != "interpreter":
+            parser.error("--profile and --trace need --engine interpreter")
+
+    if args.record:
+        from movie import MAX_INSTRUCTIONS_PER_FRAME, MAX_SEED
+
+        if args.seed is not None and not 0 <= args.seed <= MAX_SEED:
+            parser.error("--record needs a --seed from 0 to %d" % MAX_SEED)
+        if not 0 < args.instructions_per_frame <= MAX_INSTRUCTIONS_PER_FRAME:
+            parser.error(
+                "--record needs --instructions-per-frame from 1 to %d" %
+                MAX_INSTRUCTIONS_PER_FRAME
+            )
+
+    return args
+
+
+def run_headless(
+    rom,
+    cycles,
+    frames,
+    engine,
+    instructions_per_frame,
+    profile=None,
+    trace=None,
+    seed=None
+):
+    from headless import HeadlessChip8
+    from profiler import Profiler
+    from tracer import Tracer
+
+    if cycles is None and frames is None:
+        frames = 600
+
+    machine = HeadlessChip8(
+        rom,
+        instructions_per_frame=instructions_per_frame,
+        engine=engine,
+        seed=seed
+    )
+
+    profiler = None
+    if profile:
+        profiler = Profiler(machine.cpu)
+        profiler.enable()
+
+    tracer = None
+    if trace:
+        tracer = Tracer(machine.cpu, error_path=trace)
+        tracer.enable()
+
+    report = machine.run(cycles=cycles, frames=frames)
+
+    if tracer is not None:
+        tracer.disable()
+        tracer.dump(trace)
+
+    if profiler is not None:
+        profiler.disable()
+        with open(profile, "w") as f:
+            f.write(profiler.to_json())
+        with open(profile + ".folded", "w") as f:
+            f.write(profiler.to_folded())
 
-        return [int.from_bytes(d, "big") for d in data]
+    print_report(report)
+
+
+def run_sessions(rom, sessions, frames, engine, instructions_per_frame,
+                 seed=None):
+    import asyncio
+    from headless import HeadlessChip8
+
+    machines = [
+        HeadlessChip8(
+            rom,
+            instructions_per_frame=instructions_per_frame,
+            engine=engine,
+            seed=seed
+        )
+        for _ in range(sessions)
+    ]
+
+    async def run_all():
+        return await asyncio.gather(*(
+            machine.run_async(frames=frames or 600) for machine in machines
+        ))
+
+    for number, report in enumerate(asyncio.run(run_all())):
+        print("Session %d:" % number)
+        print_report(report)
+
+
+def run_replay(rom, path, engine):
+    from movie import Movie, replay
+
+    movie = Movie.load(path)
+    report = replay(movie, rom, engine=engine)
+    print_report(report)
+
+    if report['matched'] is not None:
+        print("Final state %s the recording" % (
+            "matches" if report['matched'] else "DOES NOT match"
+        ))
+
+    return report['matched'] is not False
+
+
+def print_report(report):
+    state = report['state']
+
+    print("%d instructions in %.3fs (%.0f instructions/s)" % (
+        report['cycles'],
+        report['seconds'],
+        report['instructions_per_second'],
+    ))
+    print("PC: {0:03x}  I: {1:03x}  DT: {2:02x}  ST: {3:02x}".format(
+        state['pc'], state['I'], state['delay_timer'], state['sound_timer']
+    ))
+    print(" ".join(
+        "%s=%02x" % (name, value) for name, value in state['registers'].items()
+    ))
 
 
 if __name__ == '__main__':
-    rom = load_rom("PONG")
-    chip8 = Chip8(rom)
-    chip8.run()
+    args = parse_args()
+    rom = load_rom(args.rom)
+
+    if args.replay:
+        if not run_replay(rom, args.replay, args.engine):
+            sys.exit(1)
+    elif args.sessions:
+        run_sessions(
+            rom,
+            args.sessions,
+            args.frames,
+            args.engine,
+            args.instructions_per_frame,
+            args.seed
+        )
+    elif args.headless:
+        run_headless(
+            rom,
+            args.cycles,
+            args.frames,
+            args.engine,
+            args.instructions_per_frame,
+            args.profile,
+            args.trace,
+            args.seed
+        )
+    else:
+        from chip8 import Chip8
+
+        chip8 = Chip8(
+            rom,
+            instructions_per_frame=args.instructions_per_frame,
+            scale=args.scale,
+            renderer=args.renderer,
+            debug=not args.no_debug,
+            seed=args.seed,
+            record=args.record,
+            sound=not args.no_sound
+        )
+        chip8.run()
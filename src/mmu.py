@@ -1,3 +1,6 @@
+from loader import ROM_START, validate_rom
+
+
 class Mmu:
 
     FONTS = [
@@ -19,54 +22,106 @@ class Mmu:
         0xF0, 0x80, 0xF0, 0x80, 0x80   # F
     ]
 
+    # SUPER-CHIP 8x10 digits for FX30, stored straight after FONTS once a
+    # ROM first asks for one - see load_big_font()
+    BIG_FONTS = [
+        0x3C, 0x7E, 0xE7, 0xC3, 0xC3, 0xC3, 0xC3, 0xE7, 0x7E, 0x3C,  # 0
+        0x18, 0x38, 0x58, 0x18, 0x18, 0x18, 0x18, 0x18, 0x18, 0x3C,  # 1
+        0x3E, 0x7F, 0xC3, 0x06, 0x0C, 0x18, 0x30, 0x60, 0xFF, 0xFF,  # 2
+        0x3C, 0x7E, 0xC3, 0x03, 0x0E, 0x0E, 0x03, 0xC3, 0x7E, 0x3C,  # 3
+        0x06, 0x0E, 0x1E, 0x36, 0x66, 0xC6, 0xFF, 0xFF, 0x06, 0x06,  # 4
+        0xFF, 0xFF, 0xC0, 0xC0, 0xFC, 0xFE, 0x03, 0xC3, 0x7E, 0x3C,  # 5
+        0x3E, 0x7C, 0xC0, 0xC0, 0xFC, 0xFE, 0xC3, 0xC3, 0x7E, 0x3C,  # 6
+        0xFF, 0xFF, 0x03, 0x06, 0x0C, 0x18, 0x30, 0x60, 0x60, 0x60,  # 7
+        0x3C, 0x7E, 0xC3, 0xC3, 0x7E, 0x7E, 0xC3, 0xC3, 0x7E, 0x3C,  # 8
+        0x3C, 0x7E, 0xC3, 0xC3, 0x7F, 0x3F, 0x03, 0x03, 0x3E, 0x7C,  # 9
+        0x7E, 0xFF, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF, 0xC3, 0xC3, 0xC3,  # A
+        0xFC, 0xFC, 0xC3, 0xC3, 0xFC, 0xFC, 0xC3, 0xC3, 0xFC, 0xFC,  # B
+        0x3C, 0xFF, 0xC3, 0xC0, 0xC0, 0xC0, 0xC0, 0xC3, 0xFF, 0x3C,  # C
+        0xFC, 0xFE, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xFE, 0xFC,  # D
+        0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF,  # E
+        0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC0, 0xC0, 0xC0, 0xC0   # F
+    ]
+    BIG_FONT_START = len(FONTS)
+
     def __init__(self):
         # Chip 8 has 0x1000 (4096) memory locations
         # Each memory location is 8-bits (one byte)
         # The uppermost 256 bytes (0xF00-0xFFF) are for display refresh,
         # 96 bytes below that (0xEA0-0xEFF) were for the call stack,
         # internal use, and other variables.
-        self.memory = [0 for i in range(0x1000)]
-        for i in range(len(self.FONTS)):
-            self.memory[i] = self.FONTS[i]
-
-        # 16 8-bit registers - V0 - VF
-        self.registers = {
-            'V0': 0,
-            'V1': 0,
-            'V2': 0,
-            'V3': 0,
-            'V4': 0,
-            'V5': 0,
-            'V6': 0,
-            'V7': 0,
-            'V8': 0,
-            'V9': 0,
-            'VA': 0,
-            'VB': 0,
-            'VC': 0,
-            'VD': 0,
-            'VE': 0,
-            'VF': 0
-        }
+        self.memory = bytearray(0x1000)
+        self.memory[:len(self.FONTS)] = bytes(self.FONTS)
+
+        # 16 8-bit registers - V0 - VF, indexed by register number
+        self.v = bytearray(16)
+
+        # SUPER-CHIP RPL user flags, saved and loaded by FX75 / FX85
+        self.flags = bytearray(16)
 
         # Address register I is 16 bits
         self.address_register = 0
 
+        # Flags for addresses holding translated code (see BlockTranslator)
+        # - writing to one calls code_write_listener with the address so
+        # the stale translation can be dropped
+        self.code_map = bytearray(0x1000)
+        self.code_write_listener = None
+
         # Timers
         self.delay_timer = 0
         self.sound_timer = 0
 
     def load_rom(self, rom):
-        starting_address = 0x200
-        for byte in rom:
-            self.memory[starting_address] = byte
-            starting_address += 1
+        validate_rom(rom)
+        self.memory[ROM_START:ROM_START + len(rom)] = bytes(rom)
+
+    @property
+    def registers(self):
+        '''
+        Read-only view of the register file keyed by name (V0 - VF)
+        '''
+
+        return {'V%X' % i: self.v[i] for i in range(16)}
+
+    def load_memory(self, data):
+        '''
+        Replaces the whole of memory, dropping any translations of the code
+        that was there
+        '''
+
+        self.memory[:] = data
+
+        address = self.code_map.find(1)
+        while address != -1:
+            self.code_write_listener(address)
+            address = self.code_map.find(1, address + 1)
+
+    def load_big_font(self):
+        '''
+        Puts the big font in memory if it isn't there already. Plain CHIP-8
+        ROMs can read past the small font into where it goes, so it is only
+        loaded for ROMs that use it
+        '''
+
+        start = self.BIG_FONT_START
+        end = start + len(self.BIG_FONTS)
+        font = bytes(self.BIG_FONTS)
+        if self.memory[start:end] == font:
+            return
+
+        self.memory[start:end] = font
+
+        address = self.code_map.find(1, start, end)
+        while address != -1:
+            self.code_write_listener(address)
+            address = self.code_map.find(1, address + 1, end)
 
     def read_register(self, reg):
-        return self.registers['V' + reg]
+        return self.v[reg]
 
     def write_register(self, reg, value):
-        self.registers['V' + reg] = value
+        self.v[reg] = value
 
     def read_address_register(self):
         return self.address_register
@@ -79,6 +134,8 @@ class Mmu:
 
     def write(self, address, value):
         self.memory[address] = value
+        if self.code_map[address]:
+            self.code_write_listener(address)
 
     def update_delay_timer(self):
         if self.delay_timer > 0:
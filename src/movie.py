@@ -0,0 +1,194 @@
+import hashlib
+import struct
+
+from headless import HeadlessChip8, HeadlessKeyboard
+from loader import rom_hash
+from snapshot import save_state
+
+MAGIC = b'C8MV'
+VERSION = 1
+
+# magic, version, ROM SHA-1, seed, instructions per frame, frames, number
+# of input changes, SHA-1 of the final save state (zeros if not known)
+HEADER = struct.Struct('>4sB20sIHII20s')
+
+# Largest seed and instructions per frame the header can hold
+MAX_SEED = 0xFFFFFFFF
+MAX_INSTRUCTIONS_PER_FRAME = 0xFFFF
+
+# Frame number and the 16-bit key mask held from the start of that frame
+CHANGE = struct.Struct('>IH')
+
+
+class Movie:
+    '''
+    A recorded session - the ROM it ran, the seed for CXNN and the key
+    state of every frame. Only frames where the keys changed are stored,
+    as the inputs mapping of frame number to key mask that
+    HeadlessChip8.play_inputs and batch jobs take
+    '''
+
+    def __init__(
+        self,
+        rom_hash,
+        seed,
+        instructions_per_frame,
+        frames,
+        inputs,
+        final_state=None
+    ):
+        self.rom_hash = rom_hash
+        self.seed = seed
+        self.instructions_per_frame = instructions_per_frame
+        self.frames = frames
+        self.inputs = inputs
+        self.final_state = final_state
+
+    @classmethod
+    def from_bytes(cls, data):
+        (
+            magic,
+            version,
+            digest,
+            seed,
+            instructions_per_frame,
+            frames,
+            changes,
+            final_state
+        ) = HEADER.unpack_from(data)
+
+        if magic != MAGIC:
+            raise ValueError("Not a movie")
+        if version != VERSION:
+            raise ValueError("Unsupported movie version %d" % version)
+
+        inputs = dict(
+            CHANGE.unpack_from(data, HEADER.size + i * CHANGE.size)
+            for i in range(changes)
+        )
+
+        return cls(
+            digest.hex(),
+            seed,
+            instructions_per_frame,
+            frames,
+            inputs,
+            final_state.hex() if any(final_state) else None
+        )
+
+    def to_bytes(self):
+        final_state = bytes(20)
+        if self.final_state is not None:
+            final_state = bytes.fromhex(self.final_state)
+
+        return HEADER.pack(
+            MAGIC,
+            VERSION,
+            bytes.fromhex(self.rom_hash),
+            self.seed,
+            self.instructions_per_frame,
+            self.frames,
+            len(self.inputs),
+            final_state
+        ) + b''.join(
+            CHANGE.pack(frame, mask)
+            for frame, mask in sorted(self.inputs.items())
+        )
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+
+class MovieRecorder:
+    '''
+    Records a session from a live keyboard. The Cpu has to read keys from
+    the recorder's keyboard rather than the live one - it copies the live
+    key state at the end of every frame, so keys only ever change on the
+    frame boundaries the movie records them at
+    '''
+
+    def __init__(self, source, rom, seed, instructions_per_frame):
+        # Checked up front, so a whole session isn't recorded only to fail
+        # when the movie is written
+        if not 0 <= seed <= MAX_SEED:
+            raise ValueError(
+                "Movies need a seed from 0 to %d, not %d" % (MAX_SEED, seed)
+            )
+        if not 0 < instructions_per_frame <= MAX_INSTRUCTIONS_PER_FRAME:
+            raise ValueError(
+                "Movies need from 1 to %d instructions per frame, not %d" % (
+                    MAX_INSTRUCTIONS_PER_FRAME,
+                    instructions_per_frame
+                )
+            )
+
+        self.source = source
+        self.keyboard = HeadlessKeyboard()
+        self.rom_hash = rom_hash(rom)
+        self.seed = seed
+        self.instructions_per_frame = instructions_per_frame
+        self.frames = 0
+        self.inputs = {}
+
+        self._latch()
+
+    def end_frame(self):
+        '''
+        Frame listener for the Scheduler running the recorded machine
+        '''
+
+        self.frames += 1
+        self._latch()
+
+    def finish(self, cpu):
+        return Movie(
+            self.rom_hash,
+            self.seed,
+            self.instructions_per_frame,
+            self.frames,
+            dict(self.inputs),
+            state_digest(cpu)
+        )
+
+    def _latch(self):
+        state = self.source.state
+        if state != self.keyboard.state:
+            self.keyboard.state = state
+            self.inputs[self.frames] = state
+
+
+def state_digest(cpu):
+    return hashlib.sha1(save_state(cpu)).hexdigest()
+
+
+def replay(movie, rom, engine='interpreter'):
+    '''
+    Plays a movie back headless, as fast as the host allows, and returns
+    the run report with 'matched' set to whether the machine finished in
+    the recorded state (None if the movie has no final state)
+    '''
+
+    if rom_hash(rom) != movie.rom_hash:
+        raise ValueError("Movie was recorded with a different ROM")
+
+    machine = HeadlessChip8(
+        rom,
+        instructions_per_frame=movie.instructions_per_frame,
+        engine=engine,
+        seed=movie.seed
+    )
+    machine.play_inputs(movie.inputs)
+
+    report = machine.run(frames=movie.frames)
+
+    report['matched'] = None
+    if movie.final_state is not None:
+        report['matched'] = state_digest(machine.cpu) == movie.final_state
+
+    return report
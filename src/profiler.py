@@ -0,0 +1,110 @@
+import collections
+import json
+import time
+
+
+class Profiler:
+    '''
+    Per-opcode profiler for a Cpu. enable() shadows the Cpu's execute with
+    a profiling wrapper on the instance and disable() removes it, so the
+    normal dispatch path has no checks in it when profiling is off.
+
+    Collects per-handler execution counts and cumulative time, how often
+    each pc address was executed, and call/return depth statistics. Only
+    instructions run through Cpu.execute are seen, so profile with the
+    interpreter engine
+    '''
+
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.reset()
+
+    def reset(self):
+        self.counts = collections.Counter()
+        self.seconds = collections.Counter()
+        self.addresses = collections.Counter()
+        self.depths = collections.Counter()
+        self.folded = collections.Counter()
+        self.calls = 0
+        self.returns = 0
+        self.max_depth = 0
+
+        # Subroutine addresses we are currently inside, outermost first
+        self._routines = []
+
+    def enable(self):
+        self.cpu.execute = self._execute
+
+    def disable(self):
+        self.cpu.__dict__.pop('execute', None)
+
+    def _execute(self):
+        cpu = self.cpu
+        clock = time.perf_counter
+        memory = cpu.mmu.memory
+        address = cpu.pc - 2 if cpu.halted else cpu.pc
+        op = (memory[address] << 8) | memory[address + 1]
+        depth = len(cpu.stack)
+
+        started = clock()
+        type(cpu).execute(cpu)
+        elapsed = clock() - started
+
+        name = cpu.decoded[op].func.__name__
+        self.counts[name] += 1
+        self.seconds[name] += elapsed
+        self.addresses[address] += 1
+        self.folded[';'.join(['rom'] + self._routines + [name])] += elapsed
+
+        new_depth = len(cpu.stack)
+        if new_depth > depth:
+            self.calls += 1
+            self.depths[new_depth] += 1
+            self.max_depth = max(self.max_depth, new_depth)
+            self._routines.append('sub_%03X' % cpu.pc)
+        elif new_depth < depth:
+            self.returns += 1
+            if self._routines:
+                self._routines.pop()
+
+    def report(self, hot_addresses=20):
+        total = sum(self.counts.values())
+        return {
+            'instructions': total,
+            'seconds': sum(self.seconds.values()),
+            'handlers': {
+                name: {
+                    'count': count,
+                    'seconds': self.seconds[name],
+                    'share': count / total,
+                }
+                for name, count in self.counts.most_common()
+            },
+            'hot_addresses': [
+                {'pc': '0x%03X' % address, 'count': count}
+                for address, count in self.addresses.most_common(
+                    hot_addresses
+                )
+            ],
+            'calls': {
+                'calls': self.calls,
+                'returns': self.returns,
+                'max_depth': self.max_depth,
+                'depths': dict(sorted(self.depths.items())),
+            },
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.report(**kwargs), indent=2)
+
+    def to_folded(self):
+        '''
+        Profile in the folded stack format flame graph tools take - one
+        line per distinct stack of rom;subroutines;handler, weighted by
+        microseconds spent
+        '''
+
+        return '\n'.join(
+            '%s %d' % (stack, round(seconds * 1e6))
+            for stack, seconds in sorted(self.folded.items())
+        ) + '\n'
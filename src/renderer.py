@@ -0,0 +1,175 @@
+import pygame
+
+try:
+    import numpy
+    import pygame.surfarray
+except ImportError:
+    numpy = None
+
+
+class Renderer:
+    '''
+    Draws the Display framebuffer onto a pygame surface. Only the pixels
+    that changed since the previous frame are redrawn, and render() returns the
+    rects it touched so just those need presenting.
+
+    The screen covers the display's size at construction times scale. If
+    the display switches resolution, pixels are resized to fill the same
+    area
+    '''
+
+    # Colors for unset and set pixels
+    PALETTE = ((0, 0, 0), (255, 255, 255))
+
+    def __init__(self, display, surface, scale, palette=PALETTE):
+        self.display = display
+        self.surface = surface
+        self.scale = scale
+        self.off_color, self.on_color = palette
+
+        self.area = pygame.Rect(
+            0,
+            0,
+            display.width * scale,
+            display.height * scale
+        )
+        self.pixel = scale  # Size of a pixel at the current resolution
+
+    def render(self):
+        full_redraw, changed = self.display.take_changes()
+        if full_redraw:
+            # Resolution changes always come with a full redraw
+            self.pixel = self.area.width // self.display.width
+            return [self._redraw()]
+
+        # Each run of changed pixels in a row is refilled as one rect
+        rects = []
+        pixel = self.pixel
+        for y, mask in changed.items():
+            row = self.display.rows[y]
+            for start, end in self._runs(mask):
+                rect = pygame.Rect(
+                    start * pixel,
+                    y * pixel,
+                    (end - start) * pixel,
+                    pixel
+                )
+                self.surface.fill(self.off_color, rect)
+                for lit_start, lit_end in self._runs(row, start, end):
+                    self._fill_run(lit_start, lit_end, y)
+
+                rects.append(rect)
+
+        return rects
+
+    def _redraw(self):
+        self.surface.fill(self.off_color, self.area)
+        for y, row in enumerate(self.display.rows):
+            for start, end in self._runs(row):
+                self._fill_run(start, end, y)
+
+        return self.area.copy()
+
+    def _fill_run(self, start, end, y):
+        pixel = self.pixel
+        self.surface.fill(self.on_color, (
+            start * pixel,
+            y * pixel,
+            (end - start) * pixel,
+            pixel,
+        ))
+
+    def _runs(self, bits, start=0, end=None):
+        '''
+        Yields (start_x, end_x) for each run of set pixels in a packed row,
+        with end_x exclusive, looking only at columns start to end
+        '''
+
+        width = self.display.width
+        if end is None:
+            end = width
+
+        run_start = None
+        for x in range(start, end):
+            if (bits >> (width - 1 - x)) & 1:
+                if run_start is None:
+                    run_start = x
+            elif run_start is not None:
+                yield run_start, x
+                run_start = None
+
+        if run_start is not None:
+            yield run_start, end
+
+
+class SurfarrayRenderer:
+    '''
+    Renders the whole framebuffer with NumPy. The packed rows are unpacked
+    into a pixel array, mapped through the palette and blitted in one go
+    with pygame.surfarray, then scaled up into a cached surface - so frame
+    time doesn't depend on how many pixels are lit. Needs NumPy.
+
+    Like Renderer, the screen keeps the area it had at construction when
+    the display switches resolution
+    '''
+
+    def __init__(self, display, surface, scale, palette=Renderer.PALETTE):
+        self.display = display
+        self.surface = surface
+        self.scale = scale
+        self.palette = numpy.array(palette, dtype=numpy.uint8)
+
+        self.scaled = pygame.Surface(
+            (display.width * scale, display.height * scale),
+            depth=24
+        )
+        self.area = self.scaled.get_rect()
+        self._resize()
+
+    def render(self):
+        full_redraw, changed = self.display.take_changes()
+        if not full_redraw and not changed:
+            return []
+
+        display = self.display
+        if (display.width, display.height) != self.frame.get_size():
+            self._resize()
+
+        row_bytes = display.width // 8
+        packed = numpy.frombuffer(
+            b''.join(row.to_bytes(row_bytes, 'big') for row in display.rows),
+            dtype=numpy.uint8
+        )
+        pixels = numpy.unpackbits(packed).reshape(
+            display.height,
+            display.width
+        )
+
+        # surfarray indexes by (x, y)
+        pygame.surfarray.blit_array(self.frame, self.palette[pixels.T])
+        pygame.transform.scale(self.frame, self.area.size, self.scaled)
+        self.surface.blit(self.scaled, self.area)
+
+        return [self.area]
+
+    def _resize(self):
+        self.frame = pygame.Surface(
+            (self.display.width, self.display.height),
+            depth=24
+        )
+
+
+def create_renderer(display, surface, scale, palette=None, kind='auto'):
+    '''
+    Builds a renderer of the given kind - 'rects' for the incremental
+    Renderer, 'surfarray' for the NumPy one, or 'auto' for the NumPy one
+    when NumPy is installed. Falls back to Renderer without NumPy
+    '''
+
+    if palette is None:
+        palette = Renderer.PALETTE
+
+    if kind in ('auto', 'surfarray') and numpy is not None:
+        return SurfarrayRenderer(display, surface, scale, palette)
+
+    return Renderer(display, surface, scale, palette)
@@ -0,0 +1,152 @@
+import collections
+import re
+import struct
+
+from snapshot import load_state, save_state
+
+# Runs of changed bytes, allowing short unchanged gaps inside a run so we
+# don't spend a segment header on every isolated byte
+CHANGED_RUN = re.compile(rb'[^\x00]+(?:\x00{1,4}[^\x00]+)*')
+
+# offset, length of a changed run
+SEGMENT = struct.Struct('>HH')
+
+
+class RewindBuffer:
+    '''
+    Ring buffer of per-frame machine states for stepping backwards.
+
+    Each frame is stored as a delta against the frame before it - the two
+    save_state blobs are XORed and only the non-zero runs are kept, as
+    (offset, length, bytes) segments. Every keyframe_interval frames the
+    full state is stored instead, so a rewind never replays more than that
+    many deltas. Once the buffer grows past memory_cap bytes the oldest
+    keyframe and its deltas are dropped
+    '''
+
+    KEYFRAME_INTERVAL = 60
+    MEMORY_CAP = 4 * 1024 * 1024
+
+    def __init__(
+        self,
+        memory_cap=MEMORY_CAP,
+        keyframe_interval=KEYFRAME_INTERVAL
+    ):
+        self.memory_cap = memory_cap
+        self.keyframe_interval = keyframe_interval
+
+        # (is_keyframe, data) for each frame, oldest first
+        self.frames = collections.deque()
+        self.size = 0
+
+        self._previous = None
+        self._since_keyframe = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def push(self, cpu):
+        '''
+        Records the current state of the machine cpu belongs to
+        '''
+
+        state = save_state(cpu)
+
+        if self._previous is None or \
+                len(state) != len(self._previous) or \
+                self._since_keyframe >= self.keyframe_interval:
+            self._append(True, state)
+            self._since_keyframe = 1
+        else:
+            self._append(False, encode_delta(self._previous, state))
+            self._since_keyframe += 1
+
+        self._previous = state
+
+        while self.size > self.memory_cap and len(self.frames) > 1:
+            self._drop_oldest_keyframe()
+
+    def rewind(self, cpu, frames=1):
+        '''
+        Restores the state from the given number of frames before the most
+        recently pushed one, and forgets everything after it. Rewinding
+        further back than the buffer goes stops at the oldest frame.
+        Returns how many frames were actually rewound
+        '''
+
+        if not self.frames:
+            return 0
+
+        frames = min(frames, len(self.frames) - 1)
+        target = len(self.frames) - 1 - frames
+
+        for _ in range(frames):
+            _, data = self.frames.pop()
+            self.size -= len(data)
+
+        # Replay from the nearest keyframe at or before the target
+        start = target
+        while not self.frames[start][0]:
+            start -= 1
+
+        state = self.frames[start][1]
+        for i in range(start + 1, target + 1):
+            state = apply_delta(state, self.frames[i][1])
+
+        load_state(cpu, state)
+        self._previous = state
+        self._since_keyframe = target - start + 1
+        return frames
+
+    def clear(self):
+        self.frames.clear()
+        self.size = 0
+        self._previous = None
+
+    def _append(self, is_keyframe, data):
+        self.frames.append((is_keyframe, data))
+        self.size += len(data)
+
+    def _drop_oldest_keyframe(self):
+        _, data = self.frames.popleft()
+        self.size -= len(data)
+        while self.frames and not self.frames[0][0]:
+            _, data = self.frames.popleft()
+            self.size -= len(data)
+
+        if not self.frames:
+            self._previous = None
+
+
+def encode_delta(previous, current):
+    '''
+    Encodes current as the changed runs of previous XOR current
+    '''
+
+    length = len(current)
+    diff = (
+        int.from_bytes(previous, 'big') ^ int.from_bytes(current, 'big')
+    ).to_bytes(length, 'big')
+
+    return b''.join(
+        SEGMENT.pack(run.start(), run.end() - run.start()) + run.group()
+        for run in CHANGED_RUN.finditer(diff)
+    )
+
+
+def apply_delta(previous, delta):
+    '''
+    Rebuilds the state encoded by encode_delta from the one before it
+    '''
+
+    diff = bytearray(len(previous))
+    offset = 0
+    while offset < len(delta):
+        start, length = SEGMENT.unpack_from(delta, offset)
+        offset += SEGMENT.size
+        diff[start:start + length] = delta[offset:offset + length]
+        offset += length
+
+    return (
+        int.from_bytes(previous, 'big') ^ int.from_bytes(diff, 'big')
+    ).to_bytes(len(previous), 'big')
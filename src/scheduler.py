@@ -0,0 +1,157 @@
+import time
+
+
+class Scheduler:
+    '''
+    Virtual clock for the emulator. Emulated time advances in 60 Hz frames
+    of instructions_per_frame instructions each, and the delay and sound
+    timers tick at the end of every frame, so timing only depends on the
+    number of instructions executed.
+
+    For interactive runs, tick() works out how many frames are due by the
+    wall clock and runs them. If the host falls too far behind, the
+    backlog is dropped instead of run, so we resync rather than spiral
+    '''
+
+    FRAME_RATE = 60
+    INSTRUCTIONS_PER_FRAME = 10  # ~600 instructions a second at 60 Hz
+    MAX_CATCH_UP_FRAMES = 4
+
+    def __init__(
+        self,
+        engine,
+        mmu,
+        instructions_per_frame=INSTRUCTIONS_PER_FRAME,
+        frame_rate=FRAME_RATE
+    ):
+        self.engine = engine
+        self.mmu = mmu
+
+        self.instructions_per_frame = instructions_per_frame
+        self.frame_time = 1 / frame_rate
+
+        self.cycles = 0
+        self.frames = 0
+        self.dropped_frames = 0
+
+        # Called with no arguments at the end of every frame, after the
+        # timers tick
+        self.frame_listeners = []
+
+        # Called with no arguments at the end of every frame, just before
+        # the timers tick - for anything that has to see the timer values
+        # the frame ran with
+        self.tick_listeners = []
+
+        self._frame_position = 0  # Instructions executed in current frame
+        self._next_frame_at = None  # Wall clock time the next frame is due
+
+    def run_cycles(self, cycles):
+        '''
+        Spends the given number of cycles, ending frames (and ticking
+        timers) whenever a frame's worth has been spent. Cycles spent
+        waiting in FX0A or in a skipped idle loop move emulated time on, but
+        only instructions the engine actually executed add to self.cycles
+        '''
+
+        while cycles > 0:
+            batch = min(
+                cycles,
+                self.instructions_per_frame - self._frame_position
+            )
+            executed = self.engine.run(batch)
+
+            cycles -= batch
+            self.cycles += executed
+            self._frame_position += batch
+            if self._frame_position == self.instructions_per_frame:
+                self._end_frame()
+
+    def run_frames(self, frames):
+        '''
+        Executes whole frames - any partially executed frame counts as the
+        first one
+        '''
+
+        if frames > 0:
+            self.run_cycles(
+                frames * self.instructions_per_frame - self._frame_position
+            )
+
+    def skip_frames(self, frames):
+        '''
+        Moves emulated time on by whole frames without executing anything,
+        for when the engine is waiting and couldn't have run anyway. Any
+        partially executed frame counts as the first one. The timers tick
+        every frame, but nothing changes in the frames before the last, so
+        the tick and frame listeners are only called at the end of that one
+        '''
+
+        if frames <= 0:
+            return
+
+        for _ in range(frames - 1):
+            self.frames += 1
+            self.mmu.update_delay_timer()
+            self.mmu.update_sound_timer()
+
+        self._end_frame()
+
+    def tick(self, now=None):
+        '''
+        Runs the frames that are due by the wall clock and returns how many
+        were run, which is 0 when called early
+        '''
+
+        if now is None:
+            now = time.perf_counter()
+
+        if self._next_frame_at is None:
+            self._next_frame_at = now
+
+        if now < self._next_frame_at:
+            return 0
+
+        due = int((now - self._next_frame_at) / self.frame_time) + 1
+        if due > self.MAX_CATCH_UP_FRAMES:
+            self.dropped_frames += due - self.MAX_CATCH_UP_FRAMES
+            due = self.MAX_CATCH_UP_FRAMES
+            self._next_frame_at = now + self.frame_time
+        else:
+            self._next_frame_at += due * self.frame_time
+
+        self.run_frames(due)
+        return due
+
+    def resync(self, now=None):
+        '''
+        Makes the next frame due now, for when the host has deliberately
+        not been running frames - the time spent isn't a backlog to catch
+        up on or count as dropped
+        '''
+
+        if now is None:
+            now = time.perf_counter()
+
+        self._next_frame_at = now
+
+    def time_until_next_frame(self, now=None):
+        if self._next_frame_at is None:
+            return 0
+
+        if now is None:
+            now = time.perf_counter()
+
+        return max(0, self._next_frame_at - now)
+
+    def _end_frame(self):
+        for listener in self.tick_listeners:
+            listener()
+
+        self._frame_position = 0
+        self.frames += 1
+        self.mmu.update_delay_timer()
+        self.mmu.update_sound_timer()
+
+        for listener in self.frame_listeners:
+            listener()
@@ -0,0 +1,544 @@
+import argparse
+import asyncio
+import re
+import struct
+import sys
+import time
+
+import loader
+from headless import HeadlessChip8
+from scheduler import Scheduler
+
+MAGIC = b'C8SV'
+VERSION = 1
+
+# Sent once by the server when a client connects - magic, version
+HELLO = struct.Struct('>4sB')
+
+# Server to client, before each frame's payload - kind, frame number,
+# display width and height, payload length
+FRAME = struct.Struct('>BIBBH')
+
+# Client to server - 1 for a press or 0 for a release, and the key
+KEY = struct.Struct('>BB')
+
+# Frame kinds. A keyframe's payload is the whole framebuffer, a delta's
+# is the framebuffer XORed with the previous one sent. Either way it is
+# run-length encoded
+KEYFRAME = 0
+DELTA = 1
+
+KEYFRAME_INTERVAL = 300  # Frames, 5 seconds at 60 Hz
+
+# A client this far behind has frames dropped until it catches up, then
+# gets a keyframe
+MAX_BUFFERED = 64 * 1024
+
+# How long loopback() watches a session after the first key press that
+# ends its idle spell
+PRESS_WINDOW = 0.1
+
+RUN = re.compile(b'(.)\\1*', re.S)
+
+
+def framebuffer(display):
+    '''
+    The display packed as bytes, a row at a time, most significant bit
+    leftmost
+    '''
+
+    row_bytes = display.width // 8
+    return b''.join(row.to_bytes(row_bytes, 'big') for row in display.rows)
+
+
+def xor(a, b):
+    return (
+        int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')
+    ).to_bytes(len(a), 'big')
+
+
+def rle_encode(data):
+    '''
+    Encodes data as (count, value) byte pairs, splitting runs longer than
+    255. An unchanged area of a delta is zeros, so it costs 2 bytes per
+    255 bytes of framebuffer
+    '''
+
+    encoded = bytearray()
+    for match in RUN.finditer(data):
+        value = data[match.start()]
+        length = match.end() - match.start()
+        while length > 255:
+            encoded += bytes((255, value))
+            length -= 255
+
+        encoded += bytes((length, value))
+
+    return bytes(encoded)
+
+
+def rle_decode(data):
+    decoded = bytearray()
+    for i in range(0, len(data), 2):
+        decoded += bytes((data[i + 1],)) * data[i]
+
+    return bytes(decoded)
+
+
+class StreamStats:
+    '''
+    Counts what a FrameEncoder sends. Frames that are encoded but not sent
+    because nothing changed still count towards the averages
+    '''
+
+    def __init__(self):
+        self.frames = 0
+        self.messages = 0
+        self.keyframes = 0
+        self.bytes = 0
+        self.encode_time = 0
+        self.started = time.perf_counter()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        frames = max(1, self.frames)
+        return {
+            'frames': self.frames,
+            'messages': self.messages,
+            'keyframes': self.keyframes,
+            'bytes': self.bytes,
+            'bytes_per_frame': self.bytes / frames,
+            'bytes_per_second': self.bytes / elapsed if elapsed > 0 else 0,
+            'encode_us_per_frame': self.encode_time / frames * 1e6,
+        }
+
+
+class FrameEncoder:
+    '''
+    Turns the display into frame messages. Sends a keyframe first, after
+    a resolution change and then every keyframe_interval frames, and
+    deltas in between. An unchanged screen sends nothing at all
+    '''
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.stats = StreamStats()
+        self.reset()
+
+    def reset(self):
+        '''
+        Makes the next message a keyframe
+        '''
+
+        self.previous = None
+        self.resolution = None
+        self.keyframe_at = None
+
+    def encode(self, display, frame):
+        '''
+        Returns the message for the display at the given frame number, or
+        None if there is nothing to send
+        '''
+
+        started = time.perf_counter()
+
+        current = framebuffer(display)
+        resolution = display.width, display.height
+
+        if self.previous is None or \
+                resolution != self.resolution or \
+                frame - self.keyframe_at >= self.keyframe_interval:
+            kind = KEYFRAME
+            payload = current
+            self.keyframe_at = frame
+        elif current == self.previous:
+            payload = None
+        else:
+            kind = DELTA
+            payload = xor(current, self.previous)
+
+        message = None
+        if payload is not None:
+            payload = rle_encode(payload)
+            message = FRAME.pack(
+                kind,
+                frame,
+                display.width,
+                display.height,
+                len(payload)
+            ) + payload
+
+            self.previous = current
+            self.resolution = resolution
+
+        stats = self.stats
+        stats.frames += 1
+        stats.encode_time += time.perf_counter() - started
+        if message is not None:
+            stats.messages += 1
+            stats.keyframes += kind == KEYFRAME
+            stats.bytes += len(message)
+
+        return message
+
+
+class FrameDecoder:
+    '''
+    Rebuilds the display on the client from frame messages
+    '''
+
+    def __init__(self):
+        self.width = None
+        self.height = None
+        self.frame = None
+        self.framebuffer = None
+
+    def apply(self, kind, frame, width, height, payload):
+        data = rle_decode(payload)
+        if len(data) != width // 8 * height:
+            raise ValueError("Frame %d is the wrong size" % frame)
+
+        if kind == DELTA:
+            if self.framebuffer is None or \
+                    (width, height) != (self.width, self.height):
+                raise ValueError("Delta frame %d without a keyframe" % frame)
+            data = xor(self.framebuffer, data)
+        elif kind != KEYFRAME:
+            raise ValueError("Unknown frame kind %d" % kind)
+
+        self.width = width
+        self.height = height
+        self.frame = frame
+        self.framebuffer = data
+
+    @property
+    def rows(self):
+        row_bytes = self.width // 8
+        return [
+            int.from_bytes(self.framebuffer[i:i + row_bytes], 'big')
+            for i in range(0, len(self.framebuffer), row_bytes)
+        ]
+
+
+class StreamServer:
+    '''
+    Serves a ROM over TCP. Every connection gets its own HeadlessChip8
+    running in real time on the event loop, streams its display as frame
+    messages and sends KEY messages back to its keyboard. The session
+    ends when the client disconnects, and the connection is closed when
+    the session is stopped
+    '''
+
+    def __init__(
+        self,
+        rom,
+        host='127.0.0.1',
+        port=0,
+        engine='interpreter',
+        instructions_per_frame=Scheduler.INSTRUCTIONS_PER_FRAME,
+        keyframe_interval=KEYFRAME_INTERVAL
+    ):
+        self.rom = rom
+        self.host = host
+        self.port = port
+        self.engine = engine
+        self.instructions_per_frame = instructions_per_frame
+        self.keyframe_interval = keyframe_interval
+
+        # Running sessions
+        self.sessions = []
+
+        # Called with the peer address and the session's StreamStats
+        # report whenever a session ends
+        self.session_listener = None
+
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self._serve,
+            self.host,
+            self.port
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        for machine in self.sessions:
+            machine.stop()
+
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        machine = HeadlessChip8(
+            self.rom,
+            instructions_per_frame=self.instructions_per_frame,
+            engine=self.engine
+        )
+        encoder = FrameEncoder(self.keyframe_interval)
+
+        def send_frame():
+            if writer.transport.is_closing():
+                return
+
+            if writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+                encoder.reset()
+                return
+
+            message = encoder.encode(machine.display, machine.frames)
+            if message is not None:
+                writer.write(message)
+
+        machine.scheduler.frame_listeners.append(send_frame)
+        writer.write(HELLO.pack(MAGIC, VERSION))
+
+        keys = asyncio.ensure_future(self._read_keys(reader, machine))
+        self.sessions.append(machine)
+        try:
+            await machine.run_async()
+        finally:
+            keys.cancel()
+            self.sessions.remove(machine)
+            writer.close()
+
+            if self.session_listener is not None:
+                self.session_listener(peer, encoder.stats.report())
+
+    async def _read_keys(self, reader, machine):
+        try:
+            while True:
+                pressed, key = KEY.unpack(await reader.readexactly(KEY.size))
+                if pressed:
+                    machine.keyboard.press(key & 0xF)
+                else:
+                    machine.keyboard.release(key & 0xF)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            machine.stop()
+
+
+class StreamClient:
+    '''
+    Minimal client for a StreamServer, keeping the decoded display and
+    counting what it receives
+    '''
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.decoder = FrameDecoder()
+        self.messages = 0
+        self.bytes = 0
+
+    @classmethod
+    async def connect(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+
+        magic, version = HELLO.unpack(await reader.readexactly(HELLO.size))
+        if magic != MAGIC:
+            raise ValueError("Not a Chip-8 stream")
+        if version != VERSION:
+            raise ValueError("Unsupported stream version %d" % version)
+
+        return cls(reader, writer)
+
+    async def receive(self):
+        '''
+        Reads and applies the next frame message, returning its kind, or
+        None when the server has closed the stream
+        '''
+
+        try:
+            header = await self.reader.readexactly(FRAME.size)
+        except asyncio.IncompleteReadError:
+            return None
+
+        kind, frame, width, height, length = FRAME.unpack(header)
+        payload = await self.reader.readexactly(length)
+        self.decoder.apply(kind, frame, width, height, payload)
+
+        self.messages += 1
+        self.bytes += FRAME.size + length
+        return kind
+
+    def press(self, key):
+        self.writer.write(KEY.pack(1, key))
+
+    def release(self, key):
+        self.writer.write(KEY.pack(0, key))
+
+    def close(self):
+        self.writer.close()
+
+
+async def loopback(rom, seconds, idle=1.0, **kwargs):
+    '''
+    Serves the ROM and connects a client to it over the loopback interface.
+    The client leaves it idle for idle seconds, then plays it for the given
+    number of seconds, pressing each key in turn. Then stops the session,
+    drains the stream and checks that the client's display matches the
+    server's.
+
+    Also reports what the idle spell cost - the bytes streamed during it,
+    and the instructions run in the PRESS_WINDOW after the first key
+    press, which should be no more than real time allows rather than a
+    burst catching up on the idle frames
+    '''
+
+    server = StreamServer(rom, **kwargs)
+    reports = []
+    server.session_listener = lambda peer, report: reports.append(report)
+    await server.start()
+
+    client = await StreamClient.connect('127.0.0.1', server.port)
+    receiving = asyncio.ensure_future(_receive_all(client))
+
+    machine = server.sessions[0]
+    scheduler = machine.scheduler
+
+    # Leave time for the first keyframe before counting what idling costs
+    settle = min(0.5, idle / 2)
+    await asyncio.sleep(settle)
+    idle_bytes = client.bytes
+    await asyncio.sleep(idle - settle)
+    idle_bytes = client.bytes - idle_bytes
+
+    press_cycles = machine.cycles
+    client.press(0)
+    await asyncio.sleep(PRESS_WINDOW)
+    press_cycles = machine.cycles - press_cycles
+    press_cycles_allowed = scheduler.instructions_per_frame * (
+        int(PRESS_WINDOW / scheduler.frame_time) +
+        scheduler.MAX_CATCH_UP_FRAMES
+    )
+
+    for step in range(int(seconds * 4)):
+        key = step // 2 % 16
+        if step % 2 == 0:
+            client.press(key)
+        else:
+            client.release(key)
+        await asyncio.sleep(0.25)
+
+    machine.stop()
+    await receiving
+    client.close()
+    await server.close()
+
+    return {
+        'client_messages': client.messages,
+        'client_bytes': client.bytes,
+        'matched': client.decoder.rows == machine.display.rows,
+        'idle_bytes': idle_bytes,
+        'press_cycles': press_cycles,
+        'press_cycles_allowed': press_cycles_allowed,
+        'stream': reports[0],
+    }
+
+
+async def _receive_all(client):
+    while await client.receive() is not None:
+        pass
+
+
+def print_stream_report(report):
+    print("%d frames, %d sent (%d keyframes), %d bytes" % (
+        report['frames'],
+        report['messages'],
+        report['keyframes'],
+        report['bytes']
+    ))
+    print("%.1f bytes/frame, %.0f bytes/s, %.1f us/frame encoding" % (
+        report['bytes_per_frame'],
+        report['bytes_per_second'],
+        report['encode_us_per_frame']
+    ))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Stream headless Chip-8 sessions to clients over TCP"
+    )
+    parser.add_argument("rom", help="ROM file path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--engine",
+        choices=("interpreter", "translator", "aot"),
+        default="interpreter"
+    )
+    parser.add_argument(
+        "--instructions-per-frame",
+        type=int,
+        default=Scheduler.INSTRUCTIONS_PER_FRAME
+    )
+    parser.add_argument(
+        "--loopback",
+        type=float,
+        metavar="SECONDS",
+        help="Instead of serving, play the ROM through a loopback client "
+             "for SECONDS and report the stream"
+    )
+    parser.add_argument(
+        "--idle",
+        type=float,
+        default=1.0,
+        metavar="SECONDS",
+        help="How long the loopback client stays idle before pressing keys"
+    )
+    return parser.parse_args()
+
+
+async def serve(server):
+    def session_ended(peer, report):
+        print("Session %s:%d ended" % peer[:2])
+        print_stream_report(report)
+
+    server.session_listener = session_ended
+    await server.start()
+    print("Serving on %s:%d" % (server.host, server.port))
+
+    # Run until interrupted
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    rom = loader.load_rom(args.rom)
+    options = {
+        'engine': args.engine,
+        'instructions_per_frame': args.instructions_per_frame,
+    }
+
+    if args.loopback is not None:
+        result = asyncio.run(
+            loopback(rom, args.loopback, args.idle, **options)
+        )
+        print("Client received %d messages, %d bytes" % (
+            result['client_messages'],
+            result['client_bytes']
+        ))
+        print_stream_report(result['stream'])
+        print("Idle for %.1fs: %d bytes streamed, then the first key press "
+              "ran %d instructions in %.1fs (at most %d expected)" % (
+                  args.idle,
+                  result['idle_bytes'],
+                  result['press_cycles'],
+                  PRESS_WINDOW,
+                  result['press_cycles_allowed']
+              ))
+        print("Client display %s the server's" % (
+            "matches" if result['matched'] else "DOES NOT match"
+        ))
+
+        if not result['matched'] or \
+                result['press_cycles'] > result['press_cycles_allowed']:
+            sys.exit(1)
+    else:
+        server = StreamServer(rom, args.host, args.port, **options)
+        try:
+            asyncio.run(serve(server))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,251 @@
+import struct
+
+from display import Display
+
+MAGIC = b'C8ST'
+VERSION = 3
+
+# Display sizes a snapshot can be restored to
+RESOLUTIONS = (Display.LORES, Display.HIRES)
+
+# magic, version, pc, I, delay timer, sound timer, halted, stack depth,
+# display width, display height
+HEADER = struct.Struct('>4sBHHBBBBHH')
+
+# Internal state of the Cpu's Mersenne Twister for CXNN - 624 words and
+# the position in them. All zeros, which the generator can never be in,
+# means the state isn't known
+RANDOM_STATE = struct.Struct('>625I')
+
+MEMORY_SIZE = 0x1000
+
+
+class Snapshot:
+    '''
+    Machine state captured from a Cpu and the Mmu and Display it drives.
+
+    The parts are kept as immutable bytes, so one Snapshot can be restored
+    any number of times - each restore copies into the machine's existing
+    buffers with slice assignments and the snapshot itself is never
+    written to. to_bytes() gives the compact, versioned binary form:
+
+        header (HEADER) | memory (4096) | V0 - VF (16) | RPL flags (16) |
+        random state (RANDOM_STATE) | stack (2 bytes per entry) |
+        framebuffer (width / 8 bytes per row)
+
+    Older versions still load. Version 1, from before SUPER-CHIP, has no
+    RPL flags, so they are cleared. Neither version 1 nor 2 has the random
+    state, so restoring one leaves the Cpu's random numbers alone
+    '''
+
+    def __init__(
+        self,
+        memory,
+        registers,
+        pc,
+        address_register,
+        delay_timer,
+        sound_timer,
+        halted,
+        stack,
+        width,
+        height,
+        framebuffer,
+        flags=bytes(16),
+        random_state=None
+    ):
+        self.memory = memory
+        self.registers = registers
+        self.flags = flags
+        self.random_state = random_state
+        self.pc = pc
+        self.address_register = address_register
+        self.delay_timer = delay_timer
+        self.sound_timer = sound_timer
+        self.halted = halted
+        self.stack = stack
+        self.width = width
+        self.height = height
+        self.framebuffer = framebuffer
+
+    @classmethod
+    def capture(cls, cpu):
+        mmu = cpu.mmu
+        display = cpu.display
+        row_bytes = display.width // 8
+
+        return cls(
+            bytes(mmu.memory),
+            bytes(mmu.v),
+            cpu.pc,
+            mmu.address_register,
+            mmu.delay_timer,
+            mmu.sound_timer,
+            cpu.halted,
+            tuple(cpu.stack),
+            display.width,
+            display.height,
+            b''.join(row.to_bytes(row_bytes, 'big') for row in display.rows),
+            bytes(mmu.flags),
+            cpu.random.getstate()[1]
+        )
+
+    @classmethod
+    def from_bytes(cls, blob):
+        blob = bytes(blob)
+        if len(blob) < HEADER.size:
+            raise ValueError("Truncated snapshot")
+
+        (
+            magic,
+            version,
+            pc,
+            address_register,
+            delay_timer,
+            sound_timer,
+            halted,
+            depth,
+            width,
+            height,
+        ) = HEADER.unpack_from(blob)
+
+        if magic != MAGIC:
+            raise ValueError("Not a Chip-8 snapshot")
+
+        if version not in (1, 2, VERSION):
+            raise ValueError("Unsupported snapshot version %d" % version)
+
+        size = HEADER.size + MEMORY_SIZE + 16 + depth * 2 + \
+            width // 8 * height
+        if version >= 2:
+            size += 16
+        if version >= 3:
+            size += RANDOM_STATE.size
+
+        if len(blob) != size:
+            raise ValueError(
+                "Snapshot is %d bytes, expected %d" % (len(blob), size)
+            )
+
+        offset = HEADER.size
+        memory = blob[offset:offset + MEMORY_SIZE]
+        offset += MEMORY_SIZE
+        registers = blob[offset:offset + 16]
+        offset += 16
+        flags = bytes(16)
+        if version >= 2:
+            flags = blob[offset:offset + 16]
+            offset += 16
+        random_state = None
+        if version >= 3:
+            random_state = RANDOM_STATE.unpack_from(blob, offset)
+            if not any(random_state):
+                random_state = None
+            offset += RANDOM_STATE.size
+        stack = struct.unpack_from('>%dH' % depth, blob, offset)
+        offset += depth * 2
+        framebuffer = blob[offset:]
+
+        return cls(
+            memory,
+            registers,
+            pc,
+            address_register,
+            delay_timer,
+            sound_timer,
+            bool(halted),
+            stack,
+            width,
+            height,
+            framebuffer,
+            flags,
+            random_state
+        )
+
+    def to_bytes(self):
+        random_state = self.random_state or (0,) * 625
+
+        return b''.join((
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                self.pc,
+                self.address_register,
+                self.delay_timer,
+                self.sound_timer,
+                self.halted,
+                len(self.stack),
+                self.width,
+                self.height
+            ),
+            self.memory,
+            self.registers,
+            self.flags,
+            RANDOM_STATE.pack(*random_state),
+            struct.pack('>%dH' % len(self.stack), *self.stack),
+            self.framebuffer,
+        ))
+
+    def restore(self, cpu):
+        mmu = cpu.mmu
+        display = cpu.display
+
+        if (self.width, self.height) not in RESOLUTIONS:
+            raise ValueError(
+                "Snapshot is for an unsupported %dx%d display" % (
+                    self.width,
+                    self.height
+                )
+            )
+
+        if len(self.memory) != MEMORY_SIZE:
+            raise ValueError(
+                "Snapshot has %d bytes of memory, expected %d" % (
+                    len(self.memory),
+                    MEMORY_SIZE
+                )
+            )
+
+        if (display.width, display.height) != (self.width, self.height):
+            display.set_resolution(self.width, self.height)
+
+        mmu.load_memory(self.memory)
+        mmu.v[:] = self.registers
+        mmu.flags[:] = self.flags
+        mmu.address_register = self.address_register
+        mmu.delay_timer = self.delay_timer
+        mmu.sound_timer = self.sound_timer
+
+        cpu.pc = self.pc
+        cpu.halted = self.halted
+        cpu.stack[:] = self.stack
+
+        if self.random_state is not None:
+            # CXNN only uses randint, which never touches gauss_next
+            version = cpu.random.getstate()[0]
+            cpu.random.setstate((version, tuple(self.random_state), None))
+
+        row_bytes = self.width // 8
+        framebuffer = self.framebuffer
+        display.rows[:] = [
+            int.from_bytes(framebuffer[i:i + row_bytes], 'big')
+            for i in range(0, len(framebuffer), row_bytes)
+        ]
+        display.full_redraw = True
+        display.changed = {}
+
+
+def save_state(cpu):
+    '''
+    Returns the state of the machine cpu belongs to as a binary blob
+    '''
+
+    return Snapshot.capture(cpu).to_bytes()
+
+
+def load_state(cpu, blob):
+    '''
+    Restores a blob from save_state onto the machine cpu belongs to
+    '''
+
+    Snapshot.from_bytes(blob).restore(cpu)
@@ -0,0 +1,154 @@
+import argparse
+import struct
+
+from disassembler import disassemble
+
+MAGIC = b'C8TR'
+VERSION = 1
+
+# magic, version, number of records
+HEADER = struct.Struct('>4sBI')
+
+# cycle, pc, opcode, I, mask of the V registers the instruction changed,
+# then V0 - VF after it ran
+RECORD = struct.Struct('>IHHHH16s')
+
+
+class Tracer:
+    '''
+    Instruction trace for a Cpu, kept in a fixed-size ring buffer of binary
+    records so a long run only holds on to its last capacity instructions.
+    Like the Profiler, enable() shadows the Cpu's execute on the instance
+    and disable() removes it, so tracing costs nothing while it is off.
+
+    If error_path is set, the trace is dumped there when an instruction
+    raises, before the exception carries on. Only instructions run through
+    Cpu.execute are seen, so trace with the interpreter engine
+    '''
+
+    CAPACITY = 65536
+
+    def __init__(self, cpu, capacity=CAPACITY, error_path=None):
+        self.cpu = cpu
+        self.capacity = capacity
+        self.error_path = error_path
+        self.buffer = bytearray(capacity * RECORD.size)
+        self.cycles = 0
+
+    def enable(self):
+        self.cpu.execute = self._execute
+
+    def disable(self):
+        self.cpu.__dict__.pop('execute', None)
+
+    def clear(self):
+        self.cycles = 0
+
+    def _execute(self):
+        cpu = self.cpu
+        mmu = cpu.mmu
+        memory = mmu.memory
+        v = mmu.v
+        pc = cpu.pc - 2 if cpu.halted else cpu.pc
+        before = bytes(v)
+
+        try:
+            op = (memory[pc] << 8) | memory[pc + 1]
+            type(cpu).execute(cpu)
+        except Exception:
+            if self.error_path is not None:
+                self.dump(self.error_path)
+            raise
+
+        changed = 0
+        if v != before:
+            for i in range(16):
+                if v[i] != before[i]:
+                    changed |= 1 << i
+
+        RECORD.pack_into(
+            self.buffer,
+            (self.cycles % self.capacity) * RECORD.size,
+            self.cycles & 0xFFFFFFFF,
+            pc,
+            op,
+            mmu.address_register,
+            changed,
+            bytes(v)
+        )
+        self.cycles += 1
+
+    def to_bytes(self):
+        '''
+        The buffered records, oldest first, behind a header
+        '''
+
+        count = min(self.cycles, self.capacity)
+        split = (self.cycles % self.capacity) * RECORD.size
+        if self.cycles > self.capacity:
+            records = self.buffer[split:] + self.buffer[:split]
+        else:
+            records = self.buffer[:split]
+
+        return HEADER.pack(MAGIC, VERSION, count) + bytes(records)
+
+    def dump(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+
+def read_trace(data):
+    '''
+    Yields (cycle, pc, op, I, changed) for each record of a dumped trace,
+    where changed maps the index of each V register the instruction wrote
+    to its new value
+    '''
+
+    magic, version, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a trace")
+    if version != VERSION:
+        raise ValueError("Unsupported trace version %d" % version)
+
+    for offset in range(HEADER.size, HEADER.size + count * RECORD.size,
+                        RECORD.size):
+        cycle, pc, op, i, mask, v = RECORD.unpack_from(data, offset)
+        changed = {r: v[r] for r in range(16) if (mask >> r) & 1}
+        yield cycle, pc, op, i, changed
+
+
+def format_record(cycle, pc, op, i, changed):
+    line = "%10d  %03X  %04X  %-18s I=%03X  %s" % (
+        cycle,
+        pc,
+        op,
+        disassemble(op),
+        i,
+        " ".join("V%X=%02X" % item for item in sorted(changed.items()))
+    )
+    return line.rstrip()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Print a dumped instruction trace"
+    )
+    parser.add_argument("trace", help="Trace file written by Tracer.dump")
+    parser.add_argument(
+        "--last",
+        type=int,
+        help="Only print this many of the most recent instructions"
+    )
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    with open(args.trace, 'rb') as f:
+        records = list(read_trace(f.read()))
+
+    if args.last is not None:
+        records = records[-args.last:]
+
+    for record in records:
+        print(format_record(*record))
@@ -0,0 +1,275 @@
+class BlockTranslator:
+    '''
+    Execution engine that compiles straight-line runs of ROM code (basic
+    blocks) into Python functions, cached by start address. A block runs
+    until the first instruction that can change control flow or write to
+    memory, which is the last one in the block.
+
+    Simple register ops are emitted inline, everything else calls the
+    Cpu's own decoded handler, so results match the interpreter exactly.
+    Blocks are dropped when Mmu.write touches any of their bytes
+    '''
+
+    MAX_BLOCK_LENGTH = 64
+
+    # Handlers that neither read nor change pc and don't write memory - a
+    # block can call these and carry on
+    STRAIGHT_LINE_HANDLERS = (
+        'handle_clear_screen_op',
+        'handle_scroll_down_op',
+        'handle_scroll_right_op',
+        'handle_scroll_left_op',
+        'handle_low_resolution_op',
+        'handle_high_resolution_op',
+        'handle_set_register_to_random_bitwise_value_op',
+        'handle_draw_sprite_op',
+        'handle_set_register_to_delay_timer_op',
+        'handle_set_delay_timer_to_register_op',
+        'handle_set_sound_timer_to_register_op',
+        'handle_add_register_to_address_op',
+        'handle_set_address_to_sprite_location_op',
+        'handle_fill_registers_from_address_op',
+        'handle_store_registers_in_flags_op',
+        'handle_fill_registers_from_flags_op',
+    )
+
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.mmu = cpu.mmu
+
+        # Start address -> (function, number of instructions)
+        self.blocks = {}
+
+        # Blocks starting a delay timer wait loop (see Cpu.timer_wait_loop)
+        # are kept here instead of in blocks, so run() only checks whether
+        # a loop is idle when it reaches one
+        self.idle_loops = {}
+
+        # Address -> start addresses of blocks covering it
+        self.covering = {}
+
+        # Globals for the generated code
+        self.namespace = {'cpu': cpu, 'mmu': cpu.mmu}
+
+        self.inline_emitters = {
+            0x1: self._emit_jump,
+            0x6: self._emit_set_register_to_value,
+            0x7: self._emit_add_value_to_register,
+            0x8: self._emit_register_to_register,
+            0xA: self._emit_address_register_to_value,
+        }
+
+        self.mmu.code_write_listener = self.invalidate
+
+    def run(self, cycles):
+        '''
+        Executes the given number of instructions. A block longer than what
+        is left of the budget is stepped through on the interpreter so we
+        stop on exactly the same instruction it would. Reaching an idle
+        loop skips the rest of the budget, as the interpreter does. Returns
+        how many instructions were actually executed
+        '''
+
+        cpu = self.cpu
+        blocks = self.blocks
+        budget = cycles
+
+        while cycles > 0:
+            if cpu.halted:
+                if not cpu.poll_key():
+                    return budget - cycles
+
+                cycles -= 1
+                continue
+
+            block = blocks.get(cpu.pc)
+            if block is None:
+                block = self.idle_loops.get(cpu.pc)
+                if block is None:
+                    block = self.translate(cpu.pc)
+                elif cpu.idle_loop(cpu.pc):
+                    cpu.skip_idle(cycles)
+                    return budget - cycles
+
+            if block is None or block[1] > cycles:
+                cpu.execute()
+                cycles -= 1
+            else:
+                block[0]()
+                cycles -= block[1]
+
+        return budget - cycles
+
+    def translate(self, start):
+        '''
+        Compiles the block starting at the given address and caches it.
+        Returns None if there's no complete instruction at the address
+        '''
+
+        generated = self.generate(start)
+        if generated is None:
+            return None
+
+        function_name, source, end = generated
+        exec(compile(source, '<%s>' % function_name, 'exec'), self.namespace)
+
+        return self.add_block(start, end, self.namespace.pop(function_name))
+
+    def generate(self, start):
+        '''
+        Generates the source of the block starting at the given address.
+        Returns (function name, source, end address), or None if there's no
+        complete instruction at the address. Decoded handlers the block
+        calls are bound in the namespace as op_XXXX
+        '''
+
+        memory = self.mmu.memory
+        lines = []
+        address = start
+
+        while address < 0xFFF and \
+                address - start < self.MAX_BLOCK_LENGTH * 2:
+            op = (memory[address] << 8) | memory[address + 1]
+            address += 2
+
+            emit = self.inline_emitters.get(op >> 12)
+            emitted = emit(op) if emit is not None else None
+            if emitted is not None:
+                lines.extend(emitted)
+                if op >> 12 == 0x1:
+                    break
+                continue
+
+            name = self._bind(op)
+            if self._handler_name(op) in self.STRAIGHT_LINE_HANDLERS:
+                lines.append('%s()' % name)
+                continue
+
+            # Anything else ends the block - set pc to where the
+            # interpreter would have it and let the handler take over
+            lines.append('cpu.pc = 0x%03X' % address)
+            lines.append('%s()' % name)
+            break
+        else:
+            if address == start:
+                return None
+
+            lines.append('cpu.pc = 0x%03X' % address)
+
+        function_name = 'block_%03X' % start
+        source = 'def %s():\n    v = mmu.v\n%s\n' % (
+            function_name,
+            '\n'.join('    ' + line for line in lines)
+        )
+
+        return function_name, source, address
+
+    def add_block(self, start, end, function):
+        '''
+        Caches a compiled block covering start up to end and returns it
+        '''
+
+        block = (function, (end - start) // 2)
+        if self.cpu.timer_wait_loop(start) is None:
+            self.blocks[start] = block
+        else:
+            self.idle_loops[start] = block
+
+        for covered in range(start, end):
+            self.covering.setdefault(covered, set()).add(start)
+            self.mmu.code_map[covered] = 1
+
+        return block
+
+    def invalidate(self, address):
+        '''
+        Drops every block that covers the given address
+        '''
+
+        for start in self.covering.pop(address, ()):
+            if start in self.blocks:
+                _, length = self.blocks.pop(start)
+            else:
+                _, length = self.idle_loops.pop(start)
+            for covered in range(start, start + length * 2):
+                starts = self.covering.get(covered)
+                if starts is not None:
+                    starts.discard(start)
+                    if not starts:
+                        del self.covering[covered]
+
+                if covered not in self.covering:
+                    self.mmu.code_map[covered] = 0
+
+    def invalidate_all(self):
+        for address in list(self.covering):
+            self.invalidate(address)
+
+    def _bind(self, op):
+        '''
+        Makes the Cpu's decoded handler for op callable from generated code
+        '''
+
+        name = 'op_%04X' % op
+        if name not in self.namespace:
+            self.namespace[name] = self.cpu.decoded[op]
+
+        return name
+
+    def _handler_name(self, op):
+        return self.cpu.decoded[op].func.__name__
+
+    def _emit_jump(self, op):
+        '''
+        Instruction 0x1NNN - always ends the block
+        '''
+
+        return ['cpu.pc = 0x%03X' % (op & 0xFFF)]
+
+    def _emit_set_register_to_value(self, op):
+        return ['v[%d] = 0x%02X' % ((op & 0xF00) >> 8, op & 0xFF)]
+
+    def _emit_add_value_to_register(self, op):
+        x = (op & 0xF00) >> 8
+        return ['v[%d] = (v[%d] + 0x%02X) & 0xFF' % (x, x, op & 0xFF)]
+
+    def _emit_address_register_to_value(self, op):
+        return ['mmu.address_register = 0x%03X' % (op & 0xFFF)]
+
+    def _emit_register_to_register(self, op):
+        '''
+        Instructions 0x8XYN - statements are ordered the same way as the
+        Cpu handlers so VF as an operand behaves identically
+        '''
+
+        x = (op & 0xF00) >> 8
+        y = (op & 0xF0) >> 4
+        n = op & 0xF
+
+        if n == 0x0:
+            return ['v[%d] = v[%d]' % (x, y)]
+        if n in (0x1, 0x2, 0x3):
+            operator = {0x1: '|', 0x2: '&', 0x3: '^'}[n]
+            return ['v[%d] %s= v[%d]' % (x, operator, y)]
+        if n == 0x4:
+            return [
+                't = v[%d] + v[%d]' % (x, y),
+                'v[15] = t >> 8',
+                'v[%d] = t & 0xFF' % x,
+            ]
+        if n in (0x5, 0x7):
+            minuend, subtrahend = (x, y) if n == 0x5 else (y, x)
+            return [
+                't = v[%d] - v[%d]' % (minuend, subtrahend),
+                'v[15] = 1 if t < 0 else 0',
+                'v[%d] = t & 0xFF' % x,
+            ]
+        if n == 0x6:
+            return ['v[15] = v[%d] & 0x1' % x, 'v[%d] = v[%d] >> 1' % (x, x)]
+        if n == 0xE:
+            return [
+                'v[15] = v[%d] >> 7' % x,
+                'v[%d] = (v[%d] << 1) & 0xFF' % (x, x),
+            ]
+
+        return None
@@ -0,0 +1,444 @@
+import random
+import time
+
+import numpy
+
+from loader import ROM_START, validate_rom
+from mmu import Mmu
+from scheduler import Scheduler
+
+STACK_DEPTH = 16
+WIDTH = 64
+HEIGHT = 32
+
+
+class VectorChip8:
+    '''
+    Runs many Chip-8 machines in lockstep with their state held in NumPy
+    arrays - one row per instance. Every step executes one instruction on
+    every instance: opcodes are fetched for all of them at once, then each
+    opcode family in cpu.Cpu is applied to the instances that fetched it
+    with masked array operations.
+
+    Only CHIP-8 is supported - the packed rows are 64 pixels wide, so
+    there is no SUPER-CHIP hi-res mode. An instance that fetches a
+    SUPER-CHIP opcode (00CN, 00FB - 00FF, DXY0, FX30, FX75 or FX85) is
+    flagged in unsupported and stops on that opcode for good.
+
+    Otherwise results match a scalar Cpu given the same ROM, seed and
+    keys, for as long as the scalar one runs without error. Differences
+    are limited to what would crash it: pc or I running off the end of
+    memory wraps or is ignored here, and the stack is STACK_DEPTH entries
+    deep and wraps. CXNN draws from one random.Random per instance, seeded
+    like Cpu's, so random sequences match too
+    '''
+
+    def __init__(
+        self,
+        rom,
+        count,
+        seeds=None,
+        instructions_per_frame=Scheduler.INSTRUCTIONS_PER_FRAME
+    ):
+        validate_rom(rom)
+        self.count = count
+        self.instances = numpy.arange(count)
+
+        self.memory = numpy.zeros((count, 0x1000), dtype=numpy.uint8)
+        self.memory[:, :len(Mmu.FONTS)] = Mmu.FONTS
+        self.memory[:, ROM_START:ROM_START + len(rom)] = numpy.frombuffer(
+            bytes(rom),
+            dtype=numpy.uint8
+        )
+
+        self.v = numpy.zeros((count, 16), dtype=numpy.uint8)
+        self.pc = numpy.full(count, ROM_START, dtype=numpy.int64)
+        self.address_register = numpy.zeros(count, dtype=numpy.int64)
+        self.stack = numpy.zeros((count, STACK_DEPTH), dtype=numpy.int64)
+        self.sp = numpy.zeros(count, dtype=numpy.int64)
+        self.delay_timer = numpy.zeros(count, dtype=numpy.int64)
+        self.sound_timer = numpy.zeros(count, dtype=numpy.int64)
+        self.halted = numpy.zeros(count, dtype=bool)
+
+        # Instances stopped on a SUPER-CHIP opcode
+        self.unsupported = numpy.zeros(count, dtype=bool)
+
+        # 16-bit key mask per instance, bit N set means key N is down
+        self.keys = numpy.zeros(count, dtype=numpy.int64)
+
+        # Packed framebuffers, laid out as in Display.rows
+        self.rows = numpy.zeros((count, HEIGHT), dtype=numpy.uint64)
+
+        if seeds is None:
+            seeds = [None] * count
+        self.randoms = [random.Random(seed) for seed in seeds]
+
+        self.family_handlers = {
+            0x0: self._zero_prefix_ops,
+            0x1: self._jump_op,
+            0x2: self._call_op,
+            0x3: self._truthy_value_condition_op,
+            0x4: self._falsey_value_condition_op,
+            0x5: self._truthy_register_condition_op,
+            0x6: self._set_register_to_value_op,
+            0x7: self._add_value_to_register_op,
+            0x8: self._eight_prefix_ops,
+            0x9: self._falsey_register_condition_op,
+            0xA: self._address_register_to_value_op,
+            0xB: self._jump_with_offset_op,
+            0xC: self._set_register_to_random_bitwise_value_op,
+            0xD: self._draw_sprite_op,
+            0xE: self._e_prefix_ops,
+            0xF: self._f_prefix_ops,
+        }
+
+        # The machine stands in for both the engine and the Mmu timers
+        self.scheduler = Scheduler(
+            self,
+            self,
+            instructions_per_frame=instructions_per_frame
+        )
+
+    def run(self, cycles):
+        '''
+        Steps every instance the given number of instructions and returns
+        how many that was - this is the engine interface the Scheduler
+        drives
+        '''
+
+        for _ in range(cycles):
+            self.step()
+
+        return cycles
+
+    def run_for(self, cycles=None, frames=None):
+        '''
+        Executes the given number of instructions, or of whole frames, on
+        every instance and returns a report with the aggregate rate
+        '''
+
+        if (cycles is None) == (frames is None):
+            raise ValueError("Exactly one of cycles or frames is required")
+
+        start_cycles = self.scheduler.cycles
+        started = time.perf_counter()
+
+        if frames is not None:
+            self.scheduler.run_frames(frames)
+        else:
+            self.scheduler.run_cycles(cycles)
+
+        elapsed = time.perf_counter() - started
+        cycles = self.scheduler.cycles - start_cycles
+        instructions = cycles * self.count
+
+        return {
+            'cycles': cycles,
+            'instances': self.count,
+            'seconds': elapsed,
+            'instructions_per_second':
+                instructions / elapsed if elapsed > 0 else float('inf'),
+        }
+
+    def step(self):
+        pc = self.pc
+        pc[self.halted | self.unsupported] -= 2
+
+        op = (self.memory[self.instances, pc & 0xFFF].astype(numpy.int64)
+              << 8) | self.memory[self.instances, (pc + 1) & 0xFFF]
+        pc += 2
+
+        self._op = op
+        self._x = (op >> 8) & 0xF
+        self._y = (op >> 4) & 0xF
+
+        # Group instances by opcode family with one sort, then run each
+        # family that turned up on its group
+        prefixes = op >> 12
+        order = numpy.argsort(prefixes, kind='stable')
+        counts = numpy.bincount(prefixes, minlength=16)
+        start = 0
+        for prefix in numpy.flatnonzero(counts):
+            end = start + counts[prefix]
+            self.family_handlers[prefix](order[start:end])
+            start = end
+
+    def update_delay_timer(self):
+        numpy.maximum(self.delay_timer - 1, 0, out=self.delay_timer)
+
+    def update_sound_timer(self):
+        numpy.maximum(self.sound_timer - 1, 0, out=self.sound_timer)
+
+    def state(self, instance):
+        '''
+        State of one instance, in the same form as HeadlessChip8.state
+        '''
+
+        return {
+            'cycles': self.scheduler.cycles,
+            'frames': self.scheduler.frames,
+            'pc': int(self.pc[instance]),
+            'I': int(self.address_register[instance]),
+            'registers': {
+                'V%X' % i: int(self.v[instance, i]) for i in range(16)
+            },
+            'stack': [
+                int(address)
+                for address in self.stack[instance, :self.sp[instance]]
+            ],
+            'delay_timer': int(self.delay_timer[instance]),
+            'sound_timer': int(self.sound_timer[instance]),
+            'halted': bool(self.halted[instance]),
+            'unsupported': bool(self.unsupported[instance]),
+        }
+
+    def display_rows(self, instance):
+        return [int(row) for row in self.rows[instance]]
+
+    # Operand helpers - all take the indices of the instances being run
+
+    def _vx(self, idx):
+        return self.v[idx, self._x[idx]].astype(numpy.int64)
+
+    def _vy(self, idx):
+        return self.v[idx, self._y[idx]].astype(numpy.int64)
+
+    def _set_vx(self, idx, values):
+        self.v[idx, self._x[idx]] = values
+
+    def _skip_if(self, idx, condition, amount=2):
+        self.pc[idx[condition]] += amount
+
+    def _unsupported_op(self, idx):
+        self.unsupported[idx] = True
+
+    # Opcode families, mirroring the handlers in cpu.Cpu
+
+    def _zero_prefix_ops(self, idx):
+        low = self._op[idx] & 0xFFF
+
+        clear = idx[low == 0x0E0]
+        self.rows[clear] = 0
+
+        ret = idx[low == 0x0EE]
+        self.sp[ret] -= 1
+        self.pc[ret] = self.stack[ret, self.sp[ret] % STACK_DEPTH]
+
+        superchip = ((low & 0xFF0) == 0x0C0) | \
+            ((low >= 0x0FB) & (low <= 0x0FF))
+        self._unsupported_op(idx[superchip])
+
+        # 0NNN is a no-op, see Cpu.handle_machine_code_call_op
+        other = idx[(low != 0x0E0) & (low != 0x0EE) & ~superchip]
+        self.pc[other] &= 0xFFF
+
+    def _jump_op(self, idx):
+        self.pc[idx] = self._op[idx] & 0xFFF
+
+    def _call_op(self, idx):
+        self.stack[idx, self.sp[idx] % STACK_DEPTH] = self.pc[idx]
+        self.sp[idx] += 1
+        self._jump_op(idx)
+
+    def _truthy_value_condition_op(self, idx):
+        self._skip_if(idx, self._vx(idx) == self._op[idx] & 0xFF)
+
+    def _falsey_value_condition_op(self, idx):
+        self._skip_if(idx, self._vx(idx) != self._op[idx] & 0xFF)
+
+    def _truthy_register_condition_op(self, idx):
+        self._skip_if(idx, self._vx(idx) == self._vy(idx))
+
+    def _falsey_register_condition_op(self, idx):
+        # Cpu.handle_falsey_register_condition_op skips a single byte
+        self._skip_if(idx, self._vx(idx) != self._vy(idx), amount=1)
+
+    def _set_register_to_value_op(self, idx):
+        self._set_vx(idx, self._op[idx] & 0xFF)
+
+    def _add_value_to_register_op(self, idx):
+        self._set_vx(idx, (self._vx(idx) + (self._op[idx] & 0xFF)) & 0xFF)
+
+    def _eight_prefix_ops(self, idx):
+        '''
+        0x8XYN - VF is written before VX, like the Cpu handlers, so the
+        result is the same when X is F
+        '''
+
+        n = self._op[idx] & 0xF
+
+        for operation in (0x0, 0x1, 0x2, 0x3):
+            sub = idx[n == operation]
+            if not sub.size:
+                continue
+
+            vx = self._vx(sub)
+            vy = self._vy(sub)
+            if operation == 0x0:
+                self._set_vx(sub, vy)
+            elif operation == 0x1:
+                self._set_vx(sub, vx | vy)
+            elif operation == 0x2:
+                self._set_vx(sub, vx & vy)
+            else:
+                self._set_vx(sub, vx ^ vy)
+
+        sub = idx[n == 0x4]
+        if sub.size:
+            total = self._vx(sub) + self._vy(sub)
+            self.v[sub, 0xF] = total >> 8
+            self._set_vx(sub, total & 0xFF)
+
+        for operation in (0x5, 0x7):
+            sub = idx[n == operation]
+            if not sub.size:
+                continue
+
+            if operation == 0x5:
+                difference = self._vx(sub) - self._vy(sub)
+            else:
+                difference = self._vy(sub) - self._vx(sub)
+
+            self.v[sub, 0xF] = difference < 0
+            self._set_vx(sub, difference & 0xFF)
+
+        sub = idx[n == 0x6]
+        if sub.size:
+            self.v[sub, 0xF] = self._vx(sub) & 0x1
+            self._set_vx(sub, self._vx(sub) >> 1)
+
+        sub = idx[n == 0xE]
+        if sub.size:
+            self.v[sub, 0xF] = self._vx(sub) >> 7
+            self._set_vx(sub, (self._vx(sub) << 1) & 0xFF)
+
+    def _address_register_to_value_op(self, idx):
+        self.address_register[idx] = self._op[idx] & 0xFFF
+
+    def _jump_with_offset_op(self, idx):
+        self.pc[idx] = (self._op[idx] & 0xFFF) + self.v[idx, 0]
+
+    def _set_register_to_random_bitwise_value_op(self, idx):
+        for i in idx:
+            rand = self.randoms[i].randint(0, 255)
+            self.v[i, self._x[i]] = (self._op[i] & 0xFF) & rand
+
+    def _draw_sprite_op(self, idx):
+        '''
+        0xDXYN - each sprite row is placed with a shift and rotate and
+        XORed into the packed row, as in Display.draw_sprite. DXY0 draws a
+        SUPER-CHIP 16x16 sprite, which isn't supported
+        '''
+
+        heights = self._op[idx] & 0xF
+        self._unsupported_op(idx[heights == 0])
+        idx = idx[heights != 0]
+        if not idx.size:
+            return
+
+        xs = (self._vx(idx) % WIDTH).astype(numpy.uint64)
+        ys = self._vy(idx)
+        heights = heights[heights != 0]
+        location = self.address_register[idx]
+        collided = numpy.zeros(idx.size, dtype=bool)
+
+        for row in range(int(heights.max())):
+            active = (row < heights) & (location + row < 0x1000)
+            if not active.any():
+                continue
+
+            sub = idx[active]
+            x = xs[active]
+            bits = self.memory[sub, location[active] + row].astype(
+                numpy.uint64
+            ) << numpy.uint64(WIDTH - 8)
+            wrapped = numpy.where(
+                x == 0,
+                numpy.uint64(0),
+                bits << ((numpy.uint64(WIDTH) - x) % numpy.uint64(WIDTH))
+            )
+            placed = (bits >> x) | wrapped
+
+            row_y = (ys[active] + row) % HEIGHT
+            current = self.rows[sub, row_y]
+            collided[active] |= (current & placed) != 0
+            self.rows[sub, row_y] = current ^ placed
+
+        self.v[idx, 0xF] = collided
+
+    def _pressed(self, idx, keys):
+        in_range = keys < 16
+        return in_range & (
+            ((self.keys[idx] >> numpy.where(in_range, keys, 0)) & 1) == 1
+        )
+
+    def _e_prefix_ops(self, idx):
+        nn = self._op[idx] & 0xFF
+
+        sub = idx[nn == 0x9E]
+        self._skip_if(sub, self._pressed(sub, self._vx(sub)))
+
+        sub = idx[nn == 0xA1]
+        self._skip_if(sub, ~self._pressed(sub, self._vx(sub)))
+
+    def _f_prefix_ops(self, idx):
+        nn = self._op[idx] & 0xFF
+
+        sub = idx[nn == 0x07]
+        self._set_vx(sub, self.delay_timer[sub])
+
+        sub = idx[nn == 0x0A]
+        if sub.size:
+            # Lowest pressed key, like HeadlessKeyboard.get_pressed
+            keys = self.keys[sub]
+            pressed = numpy.full(sub.size, -1, dtype=numpy.int64)
+            for key in range(15, -1, -1):
+                pressed[((keys >> key) & 1) == 1] = key
+
+            self.halted[sub] = pressed < 0
+            got_key = sub[pressed >= 0]
+            self._set_vx(got_key, pressed[pressed >= 0])
+
+        sub = idx[nn == 0x15]
+        self.delay_timer[sub] = self._vx(sub)
+
+        sub = idx[nn == 0x18]
+        self.sound_timer[sub] = self._vx(sub)
+
+        sub = idx[nn == 0x1E]
+        if sub.size:
+            result = self.address_register[sub] + self._vx(sub)
+            overflow = result > 0xFFF
+            result[overflow] -= 0x100
+            self.v[sub, 0xF] = overflow
+            self.address_register[sub] = result
+
+        sub = idx[nn == 0x29]
+        self.address_register[sub] = self._vx(sub) * 5
+
+        self._unsupported_op(idx[(nn == 0x30) | (nn == 0x75) | (nn == 0x85)])
+
+        sub = idx[nn == 0x33]
+        if sub.size:
+            value = self._vx(sub)
+            digits = (value // 100, (value // 10) % 10, value % 10)
+            for offset, digit in enumerate(digits):
+                address = self.address_register[sub] + offset
+                ok = address < 0x1000
+                self.memory[sub[ok], address[ok]] = digit[ok]
+
+        sub = idx[nn == 0x55]
+        if sub.size:
+            x = self._x[sub]
+            for i in range(16):
+                address = self.address_register[sub] + i
+                ok = (i <= x) & (address < 0x1000)
+                self.memory[sub[ok], address[ok]] = self.v[sub[ok], i]
+
+        sub = idx[nn == 0x65]
+        if sub.size:
+            x = self._x[sub]
+            for i in range(16):
+                address = self.address_register[sub] + i
+                ok = (i <= x) & (address < 0x1000)
+                self.v[sub[ok], i] = self.memory[sub[ok], address[ok]]